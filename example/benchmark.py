@@ -0,0 +1,56 @@
+import sys, os, time
+
+# 저장소 폴더에서 실행할 때 theseed_bot을 찾도록 함
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from theseed_bot import namumark
+
+# 닫히지 않은 문법이 반복되는 문서
+cases = {
+    '각주': lambda n: '[* ' * n,
+    '중괄호': lambda n: '{{{' * n,
+    '글씨 크기': lambda n: '{{{+1 a ' * n,
+    'wiki': lambda n: '{{{#!wiki\n' * n,
+    '접기': lambda n: '{{{#!folding 더보기\n' * n,
+    '링크': lambda n: '[[' * n,
+    '텍스트 서식': lambda n: "'''a ''b --c __d ^^e ,,f ~~g " * n,
+    '혼합': lambda n: "'''[[a|''b --c {{{+1 d " * n,
+    '표': lambda n: '||a\n' * n,
+    # 짝이 맞지 않는 괄호가 많고 닫는 괄호는 문서 끝에만 있는 경우 (코드, 가사 등)
+    '코드': lambda n: "if (a[i] < b[[j) { '''x\n" * n + "]] ] ''' }}}",
+    # 칸이 많은 표 (목록, 통계 등)
+    '데이터 표': lambda n: '||<bgcolor=#fff> 1 ||이름|| [[문서]] ||12,345||\n' * n,
+}
+
+sizes = [250, 500, 1000, 2000, 4000]
+
+def measure(text, repeat = 3):
+    result = None
+
+    for k in range(repeat):
+        start = time.perf_counter()
+        namumark.Namumark('benchmark', text)
+        elapsed = time.perf_counter() - start
+
+        if result == None or elapsed < result:
+            result = elapsed
+
+    return result
+
+if __name__ == '__main__':
+    # 특정 항목만 측정: python benchmark.py 표 혼합
+    names = sys.argv[1:] if len(sys.argv) > 1 else list(cases.keys())
+
+    for name in names:
+        line = name
+        prev = None
+
+        for n in sizes:
+            elapsed = measure(cases[name](n))
+
+            # 입력 크기가 두 배일 때 시간 비율, 선형이면 약 2
+            ratio = ' (x{:.1f})'.format(elapsed / prev) if prev else ''
+            line += '  {}: {:.3f}s{}'.format(n, elapsed, ratio)
+            prev = elapsed
+
+        print(line)
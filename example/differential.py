@@ -0,0 +1,127 @@
+import sys, os, time, random
+
+# 저장소 폴더에서 실행할 때 theseed_bot과 tests의 예시 문서 생성기를 찾도록 함
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [root, os.path.join(root, 'tests')]
+
+from theseed_bot import namumark
+from helpers import sample, nested_fragment
+
+# 파서 엔진(reference, fast)으로 같은 문서를 파싱해 트리와 render() 결과를 비교하고 속도를 측정
+# python example/differential.py [문서 파일 또는 폴더 ...] (없으면 예시 문서 사용)
+
+# 한 문서를 파싱하는 시간 한도(초), 넘으면 비교하지 않음
+timeout = 10
+
+# 엔진끼리 달랐던 문서
+known_cases = [
+    '[[a|||b||\n||' + 'c' * 80 + '||]]', # 줄을 넘는 표로 시작하는 링크
+]
+
+def load_corpus(paths):
+    corpus = []
+
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(os.path.join(root, name) for root, dirs, names in os.walk(path) for name in names)
+        else:
+            files = [path]
+
+        for file in files:
+            with open(file, encoding = 'utf-8') as f:
+                corpus.append((os.path.splitext(os.path.basename(file))[0], f.read()))
+
+    return corpus
+
+def walk(node, depth, result):
+    # 트리를 (깊이, 노드 종류, ...) 목록으로 펼침
+    if node == None or isinstance(node, str):
+        return
+    
+    if isinstance(node, list):
+        for child in node:
+            walk(child, depth, result)
+    elif isinstance(node, namumark.Paragraph):
+        result.append((depth, 'Paragraph', node.level, node.hidden))
+        walk(node.title, depth + 1, result)
+        walk(node.content, depth + 1, result)
+        walk(node.child, depth + 1, result)
+    elif isinstance(node, namumark.TableCell):
+        result.append((depth, 'TableCell', repr(sorted(node.styles.items()))))
+        walk(node.content, depth + 1, result)
+    elif isinstance(node, namumark.PlainText):
+        result.append((depth, 'PlainText', node.content))
+    else:
+        result.append((depth, type(node).__name__, node.indent, str(node)))
+        walk(node.content, depth + 1, result)
+
+def compare(title, text):
+    # 엔진별 (펼친 트리, render 결과, 파싱 시간), 한도를 넘으면 None
+    result = {}
+
+    for engine in namumark.Namumark.engines:
+        try:
+            start = time.perf_counter()
+            doc = namumark.Namumark(title, text, engine = engine, timeout = timeout, strict = True)
+            elapsed = time.perf_counter() - start
+
+            tree = []
+            walk(doc.paragraphs, 0, tree)
+
+            result[engine] = (tree, doc.render(), elapsed)
+        except (namumark.ParseLimitError, RecursionError):
+            return None
+
+    return result
+
+def first_difference(a, b):
+    # 두 목록이 처음 다른 위치와 그 위치의 항목 (끝을 넘으면 None)
+    k = 0
+    while k < len(a) and k < len(b) and a[k] == b[k]:
+        k += 1
+
+    return k, a[k] if k < len(a) else None, b[k] if k < len(b) else None
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        corpus = load_corpus(sys.argv[1:])
+    else:
+        corpus = [('예시 {}'.format(seed), sample(seed)) for seed in range(20)]
+        corpus += [('조각 {}'.format(seed), nested_fragment(random.Random(seed))) for seed in range(300)]
+        corpus += [('사례 {}'.format(k), text) for k, text in enumerate(known_cases)]
+
+    reference, fast = namumark.Namumark.engines
+
+    mismatches = 0
+    skipped = 0
+    size = 0
+    elapsed = {engine: 0 for engine in namumark.Namumark.engines}
+
+    for title, text in corpus:
+        result = compare(title, text)
+
+        if result == None:
+            print('{}: {}초 안에 파싱되지 않음'.format(title, timeout))
+            skipped += 1
+            continue
+
+        size += len(text)
+        for engine in result:
+            elapsed[engine] += result[engine][2]
+
+        if result[reference][0] != result[fast][0]:
+            k, x, y = first_difference(result[reference][0], result[fast][0])
+            print('{}: 트리 다름 ({}번째 노드)\n  {}: {}\n  {}: {}'.format(title, k, reference, x, fast, y))
+            mismatches += 1
+        elif result[reference][1] != result[fast][1]:
+            k, x, y = first_difference(result[reference][1].splitlines(), result[fast][1].splitlines())
+            print('{}: render() 다름 ({}번째 줄)\n  {}: {!r}\n  {}: {!r}'.format(title, k + 1, reference, x, fast, y))
+            mismatches += 1
+
+    print('문서 {}개, 다름 {}개, 건너뜀 {}개'.format(len(corpus), mismatches, skipped))
+
+    for engine in namumark.Namumark.engines:
+        print('{}: {:.3f}s ({:.0f}자/s)'.format(engine, elapsed[engine], size / elapsed[engine] if elapsed[engine] else 0))
+
+    if elapsed[fast]:
+        print('{} / {}: x{:.1f}'.format(reference, fast, elapsed[reference] / elapsed[fast]))
@@ -1,4 +1,4 @@
-import re, math, sys, os, difflib, time, requests
+import re, math, sys, os, time, requests
 from theseed_bot import namumark
 
 targets = [('문서명 1', '대체 문서명 1'), ('문서명 2', '대체 문서명 2')]
@@ -23,9 +23,14 @@ def edit_link(title, text):
                 # 링크에 대체 텍스트가 없는 경우 원본 텍스트 유지
                 link.content = [namumark.PlainText(target)]
     
+    # 바뀐 노드가 없으면 render(), diff, 편집 요청 생략
+    if not parser.modified:
+        return (None, log)
+    
     new_text = parser.render()
 
-    sys.stdout.writelines(list(difflib.unified_diff(text.splitlines(keepends = True), new_text.splitlines(keepends = True))))
+    # 바뀐 노드 주변만 비교한 unified diff
+    sys.stdout.writelines(parser.unified_diff())
         
     return (new_text, log)
                     
@@ -58,6 +63,8 @@ if __name__ == '__main__':
             
             token = res['token']
             new_text, log = edit_link(doc, res['text'])
+            if new_text == None:
+                continue
             
             res = requests.post('https://namu.wiki/api/edit/{}'.format(doc), json = {'text': new_text, 'log': log, 'token': token}, headers = headers)
             print(res.text)
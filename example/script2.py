@@ -1,4 +1,4 @@
-import re, math, sys, os, difflib, time, requests
+import re, math, sys, os, time, requests
 from theseed_bot import namumark
 
 targets = ['문서명 1', '문서명 2', '문서명 3', '문서명 4']
@@ -23,9 +23,14 @@ def remove_color(title, text):
             idx = c.parent.content.index(c)
             c.parent.content = c.parent.content[:idx] + c.content + c.parent.content[idx+1:]
     
+    # 바뀐 노드가 없으면 render(), diff, 편집 요청 생략
+    if not parser.modified:
+        return (None, log.format(target))
+    
     new_text = parser.render()
 
-    sys.stdout.writelines(list(difflib.unified_diff(text.splitlines(keepends = True), new_text.splitlines(keepends = True))))
+    # 바뀐 노드 주변만 비교한 unified diff
+    sys.stdout.writelines(parser.unified_diff())
     
     return (new_text, log.format(target))
                     
@@ -58,6 +63,8 @@ if __name__ == '__main__':
             
             token = res['token']
             new_text, log = remove_color('문서', doc, False, res['text'])
+            if new_text == None:
+                continue
             
             res = requests.post('https://namu.wiki/api/edit/{}'.format(doc), json = {'text': new_text, 'log': log, 'token': token}, headers = headers)
             print(res.text)
@@ -1,4 +1,4 @@
-import re, math, sys, os, difflib, time, requests
+import re, math, sys, os, time, requests
 from theseed_bot import theseed, namumark
 
 targets = ['문서명 1', '문서명 2', '문서명 3', '문서명 4']
@@ -38,9 +38,14 @@ def edit_dark(title, text):
     for target in table_targets:
         target.compress()
 
+    # 바뀐 노드가 없으면 render(), diff, 편집 요청 생략
+    if not parser.modified:
+        return (None, log)
+    
     new_text = parser.render()
 
-    sys.stdout.writelines(list(difflib.unified_diff(text.splitlines(keepends = True), new_text.splitlines(keepends = True))))
+    # 바뀐 노드 주변만 비교한 unified diff
+    sys.stdout.writelines(parser.unified_diff())
     
     return (new_text, log)
                     
@@ -59,6 +64,8 @@ if __name__ == '__main__':
         
         token = res['token']
         new_text, log = edit_dark('문서', doc, False, res['text'])
+        if new_text == None:
+            continue
         
         res = requests.post('https://namu.wiki/api/edit/{}'.format(doc), json = {'text': new_text, 'log': log, 'token': token}, headers = headers)
         print(res.text)
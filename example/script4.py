@@ -19,6 +19,10 @@ def unify_align(title, text):
         # 아래 함수는 <(><:><)>를 ||에 붙이는 여백 문법으로 바꿉니다.
         target.compress_align()
     
+    # 바뀐 노드가 없으면 render(), diff, 편집 요청 생략
+    if not parser.modified:
+        return (None, log)
+    
     new_text = parser.render()
 
     return (new_text, log)
@@ -38,6 +42,8 @@ if __name__ == '__main__':
         
         token = res['token']
         new_text, log = unify_align('문서', doc, False, res['text'])
+        if new_text == None:
+            continue
         
         res = requests.post('https://namu.wiki/api/edit/{}'.format(doc), json = {'text': new_text, 'log': log, 'token': token}, headers = headers)
         print(res.text)
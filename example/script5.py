@@ -1,4 +1,4 @@
-import re, math, sys, os, difflib, time, requests
+import re, math, sys, os, time, requests
 from theseed_bot import namumark
 
 targets = [('분류:분류 1', '분류:대체 분류 1'), ('분류:분류 2', '분류:대체 분류 2')]
@@ -15,9 +15,14 @@ def edit_category(title, text):
     # 분류를 모두 상단으로 이동
     parser.move_category(namumark.CategoryPosition.TOP)
     
+    # 바뀐 노드가 없으면 render(), diff, 편집 요청 생략
+    if not parser.modified:
+        return (None, log)
+    
     new_text = parser.render()
 
-    sys.stdout.writelines(list(difflib.unified_diff(text.splitlines(keepends = True), new_text.splitlines(keepends = True))))
+    # 바뀐 노드 주변만 비교한 unified diff
+    sys.stdout.writelines(parser.unified_diff())
         
     return (new_text, log)
                     
@@ -50,6 +55,8 @@ if __name__ == '__main__':
             
             token = res['token']
             new_text, log = edit_category(doc, res['text'])
+            if new_text == None:
+                continue
             
             res = requests.post('https://namu.wiki/api/edit/{}'.format(doc), json = {'text': new_text, 'log': log, 'token': token}, headers = headers)
             print(res.text)
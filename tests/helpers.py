@@ -0,0 +1,79 @@
+import random
+from theseed_bot import namumark
+
+# lines of the sample documents, one construct or more each
+sample_lines = [
+    '== 개요 ==',
+    '=== 역사 ===',
+    '==# 숨긴 문단 #==',
+    '나무위키는 누구나 기여할 수 있는 [[위키]]입니다.[* 2015년부터]',
+    "'''굵게''' ''기울임'' --취소선-- ~~취소선~~ __밑줄__ ^^위첨자^^ ,,아래첨자,,",
+    '{{{+1 큰 글씨}}} {{{#red 빨간 글씨}}} {{{#red,#blue 두 색}}} {{{나무위키 [[문법]]}}}',
+    '[[문서|표시]] [[문서#s-1]] [[https://namu.wiki|외부]] [[파일:그림.png|width=100]] [include(틀:예시, 인자=값)]',
+    '[[분류:위키]]',
+    ' * 목록 [[항목]]',
+    '  * 안쪽 목록',
+    ' 1. 번호 목록',
+    ' a.#3 시작 번호',
+    '> 인용문 [[링크]]',
+    '>> 두 번 인용',
+    '||<tablealign=center><bgcolor=#fff> 칸 || [[링크]] ||',
+    '||<-2><:> 합친 칸 ||',
+    '|캡션| 칸 || 칸 ||',
+    '||<|2> 행 합침 || a ||',
+    '|| b ||',
+    '||<-2> {{{#!wiki style="color: red"',
+    '칸 안의 문단',
+    '}}} ||',
+    '{{{#!folding 접기',
+    '[br][age(2000-01-01)] <math>x^2</math> [math(y)]',
+    '}}}',
+    '{{{#!if a == 1',
+    '조건',
+    '}}}',
+    '{{{#!html <b>굵게</b>}}}',
+    '{{|옛 상자|}}',
+    '## 주석',
+    '----',
+    '',
+    '   ',
+]
+
+def sample(seed, lines = 60):
+    rng = random.Random(seed)
+    return '\n'.join(rng.choice(sample_lines) for _ in range(lines)) + rng.choice(['', '\n', '\n\n'])
+
+# pieces of generated fragments, which nest tables and markup in links and other markup
+fragment_pieces = [
+    '[[a|', '[[a]]', ']]', '[[', '||', '|||', '||<bgcolor=red>', '||\n', '\n||', '\n', ' ', 'b', 'c' * 80,
+    "'''", "''", '--', '{{{', '}}}', '{{{#red ', '{{{+1 ', '[*', ']', '[br]', '> ', ' * ', '{{{#!wiki\n',
+]
+
+def fragment(rng, pieces = 8):
+    return ''.join(rng.choice(fragment_pieces) for _ in range(rng.randint(1, pieces)))
+
+# markup whose content opens with a table
+fragment_wrappers = [('[[a|', ']]'), ("'''", "'''"), ('{{{#red ', '}}}'), ('[*', 'a]')]
+
+def nested_fragment(rng, pieces = 12):
+    open, close = rng.choice(fragment_wrappers)
+    return open + '||' + fragment(rng, pieces) + '||' + close
+
+def dump(node):
+    # structure of a parsed tree, for comparing trees
+    if node == None or isinstance(node, (str, int)):
+        return node
+    
+    if isinstance(node, list):
+        return [dump(child) for child in node]
+    
+    if isinstance(node, namumark.PlainText):
+        return node.content
+    
+    if isinstance(node, namumark.Paragraph):
+        return ('Paragraph', dump(node.title), node.level, node.hidden, dump(node.content), dump(node.child))
+    
+    if isinstance(node, namumark.TableCell):
+        return ('TableCell', sorted((k, repr(v)) for k, v in node.styles.items()), dump(node.content))
+    
+    return (type(node).__name__, node.indent, str(node), dump(node.content))
@@ -0,0 +1,198 @@
+import io, random, difflib, pytest
+from theseed_bot import namumark
+from helpers import sample, dump
+
+docs = [sample(seed).replace('[[분류:위키]]', '') for seed in range(20, 30)]
+
+def apply_hunks(text, hunks):
+    result = []
+    position = 0
+    
+    for start, end, new_text in hunks:
+        assert position <= start <= end
+        result += [text[position:start], new_text]
+        position = end
+    
+    return ''.join(result) + text[position:]
+
+@pytest.mark.parametrize('seed', range(10))
+def test_apply_text_edit_matches_a_fresh_parse(seed):
+    rng = random.Random(seed)
+    text = docs[seed]
+    doc = namumark.Namumark('T', text)
+    
+    for k in range(5):
+        start = rng.randrange(len(text) + 1)
+        end = min(len(text), start + rng.randrange(10))
+        replacement = rng.choice(['', 'x', '\n', '[[새 링크]]', '\n== 새 문단 ==\n', "'''굵게'''", '||'])
+        
+        doc.apply_text_edit(start, end, replacement)
+        text = text[:start] + replacement + text[end:]
+        
+        assert doc.document.text == text
+        assert dump(doc.paragraphs) == dump(namumark.Namumark('T', text).paragraphs)
+        assert doc.render() == namumark.Namumark('T', text).render()
+
+def test_apply_text_edit_keeps_the_alt_of_categories():
+    # a duplicate category link in the alt of another is extracted after the alt is taken, as in a fresh parse
+    text = '[[분류:a]]\nx\n[[분류:b|[[분류:a]] 설명]]\n'
+    doc = namumark.Namumark('T', text)
+    doc.apply_text_edit(text.index('x'), text.index('x') + 1, 'z')
+    
+    assert [(c.link, c.alt) for c in doc.categories] == [('분류:a', None), ('분류:b', '[[분류:a]] 설명')]
+    assert doc.render() == namumark.Namumark('T', text.replace('x', 'z')).render()
+
+def test_render_to_and_iter_render():
+    doc = namumark.Namumark('T', docs[0])
+    fp = io.StringIO()
+    doc.render_to(fp)
+    
+    assert fp.getvalue() == doc.render() == ''.join(doc.iter_render())
+
+def test_render_changed_plain_lines():
+    doc = namumark.Namumark('T', '== a ==\nx\n y\n[[b]] z\n== c ==\nw\n')
+    
+    for line in doc.paragraphs.child[0].content:
+        for node in line.content:
+            if isinstance(node, namumark.PlainText):
+                node.content = node.content.upper()
+    
+    assert doc.render() == '== a ==\nX\n Y\n[[b]] Z\n== c ==\nw\n'
+
+@pytest.mark.parametrize('text', ['[[a]] x\nline2\nline3\n', '[[a]]\n\n\n', '== h ==\n[[a]]\n\n', '[[a]]'])
+def test_changed_content_keeps_the_trailing_newlines(text):
+    doc = namumark.Namumark('T', text)
+    doc.paragraphs.find_all(type = 'LinkedText', recursive = True)[0].link = 'b'
+    
+    assert doc.render() == text.replace('[[a]]', '[[b]]')
+    assert doc.diff() == [(text.index('a'), text.index('a') + 1, 'b')]
+
+@pytest.mark.parametrize('text', ['{{{#!wiki style="a:b"\n[[a]]\n}}}\n', '{{{#!wiki\n[[a]] x\n}}}', '||<:>  [[a]]  ||\n', '||<tablewidth=100%> b || [[a]]||\n'])
+def test_changed_content_keeps_the_open_tags(text):
+    doc = namumark.Namumark('T', text)
+    doc.paragraphs.find_all(type = 'LinkedText', recursive = True)[0].link = 'b'
+    
+    assert doc.render() == text.replace('[[a]]', '[[b]]')
+    assert doc.diff() == [(text.index('a]]'), text.index('a]]') + 1, 'b')]
+
+def test_changed_styles_are_rendered():
+    doc = namumark.Namumark('T', '{{{#!wiki style="a:b"\n[[a]]\n}}}\n||<:>  [[a]]  ||\n')
+    doc.paragraphs.find_all(type = 'WikiDiv', recursive = True)[0].styles['a'] = 'c'
+    doc.paragraphs.find_all(type = 'WikiDiv', recursive = True)[0].mark_dirty()
+    doc.paragraphs.find_all(type = 'Table', recursive = True)[0].content[0][0].styles = {}
+    
+    assert doc.render() == '{{{#!wiki style="a: c"\n[[a]]\n}}}\n||[[a]]  ||\n'
+
+@pytest.mark.parametrize('text', docs)
+def test_diff_gives_render(text):
+    doc = namumark.Namumark('T', text)
+    for link in doc.paragraphs.find_all(type = 'LinkedText', recursive = True)[::3]:
+        link.link = '바뀐 문서'
+    
+    assert doc.modified
+    for trim in (True, False):
+        assert apply_hunks(text, doc.diff(trim = trim)) == doc.render()
+
+def test_unified_diff():
+    text = 'a\nb\n[[c]]\nd\ne\n== f ==\ng\n'
+    doc = namumark.Namumark('T', text)
+    doc.paragraphs.find_all(type = 'LinkedText', recursive = True)[0].link = 'x'
+    
+    assert doc.unified_diff(n = 1) == ['--- \n', '+++ \n', '@@ -2,3 +2,3 @@\n', ' b\n', '-[[c]]\n', '+[[x]]\n', ' d\n']
+    assert namumark.Namumark('T', text).unified_diff() == []
+
+def test_unified_diff_matches_difflib():
+    text = 'x\n{{{#!wiki\na\nb\n[[c]]\nd\n[[e]]\n[[f]] g\n}}}\ny\n'
+    doc = namumark.Namumark('T', text)
+    wiki = doc.paragraphs.find_all(type = 'WikiDiv', recursive = True)[0]
+    wiki.content[0].content = 'A\nb\n'
+    for link in wiki.find_all(type = 'LinkedText')[1:]:
+        link.link = link.link.upper()
+    
+    # unchanged plain text in the changed wiki block is copied, and left out of the hunks
+    e, f = text.index('[[e]]'), text.index('[[f]]')
+    assert doc.diff(trim = False) == [(12, 14, 'A\n'), (e, e + 5, '[[E]]'), (f, f + 5, '[[F]]')]
+    for n in range(4):
+        assert doc.unified_diff(n = n) == list(difflib.unified_diff(text.splitlines(True), doc.render().splitlines(True), n = n))
+
+@pytest.mark.parametrize('seed', range(10))
+def test_diff_after_apply_text_edit(seed):
+    rng = random.Random(seed)
+    text = docs[seed]
+    doc = namumark.Namumark('T', text)
+    
+    for k in range(3):
+        start = rng.randrange(len(doc.document.text))
+        doc.apply_text_edit(start, start + rng.randint(0, 5), rng.choice(['', 'x', '\n', '[[q]]']))
+    
+    for link in doc.paragraphs.find_all(type = 'LinkedText', recursive = True)[::4]:
+        link.link = '바뀐 문서'
+    
+    assert doc.base_text == text
+    for trim in (True, False):
+        assert apply_hunks(text, doc.diff(trim = trim)) == doc.render()
+
+def test_unified_diff_after_apply_text_edit():
+    text = 'a\nb\n[[c]]\nd\ne\n'
+    doc = namumark.Namumark('T', text)
+    doc.apply_text_edit(0, 1, 'z')
+    
+    assert doc.modified
+    assert doc.diff() == [(0, 1, 'z')]
+    assert doc.unified_diff(n = 1) == ['--- \n', '+++ \n', '@@ -1,2 +1,2 @@\n', '-a\n', '+z\n', ' b\n']
+
+def test_merge_with_upstream_edits():
+    text = '== A ==\n[[a]] [[d]] x\n== B ==\ny [[b]]\n'
+    doc = namumark.Namumark('T', text)
+    doc.paragraphs.find_all(type = 'LinkedText', recursive = True)[0].link = 'c'
+    
+    # edits elsewhere, on the same line too, are merged
+    result = doc.merge(text.replace('y [[b]]', 'y [[b]] z').replace('[[d]]', '[[e]]'))
+    assert result == ('== A ==\n[[c]] [[e]] x\n== B ==\ny [[b]] z\n', [])
+    
+    # an edit of the same link is a conflict, and the upstream text is kept
+    result = doc.merge(text.replace('[[a]]', '[[aa]]'))
+    assert result.text == text.replace('[[a]]', '[[aa]]')
+    assert len(result.conflicts) == 1
+
+def test_style_methods_mark_only_changes():
+    text = '||<bgcolor=#fff,#191919> a || b ||\n{{{#red,#ff8080 x}}}\n'
+    doc = namumark.Namumark('T', text)
+    
+    for table in doc.paragraphs.find_all(type = 'Table', recursive = True):
+        table.generate_dark()
+        table.compress()
+        table.compress_align()
+    
+    for colored_text in doc.paragraphs.find_all(type = 'ColoredText', recursive = True):
+        colored_text.generate_dark()
+    
+    assert not doc.modified
+    
+    doc = namumark.Namumark('T', '||<bgcolor=#fff> a || b ||\n{{{#000 x}}}\n')
+    doc.paragraphs.find_all(type = 'Table', recursive = True)[0].generate_dark()
+    doc.paragraphs.find_all(type = 'ColoredText', recursive = True)[0].generate_dark()
+    
+    assert doc.modified
+    assert doc.render() == '||<bgcolor=#fff,#191919> a || b ||\n{{{#000,#e5e5e5 x}}}\n'
+
+def test_merge_after_apply_text_edit():
+    text = '== A ==\n[[a]] x\n== B ==\ny [[b]]\n'
+    doc = namumark.Namumark('T', text)
+    doc.apply_text_edit(text.index('x'), text.index('x') + 1, 'w')
+    doc.paragraphs.find_all(type = 'LinkedText', recursive = True)[1].link = 'c'
+    
+    result = doc.merge(text.replace('== B ==', '== B2 =='))
+    assert result == ('== A ==\n[[a]] w\n== B2 ==\ny [[c]]\n', [])
+
+def test_merge_hunks():
+    assert namumark.merge_hunks('abc\ndef\n', [(0, 1, 'x')], 'abc\ndeg\n') == ('xbc\ndeg\n', [])
+    assert namumark.merge_hunks('abc\n', [(1, 2, 'x')], 'aXc\n') == ('aXc\n', [(1, 2, 'x')])
+
+def test_nodes_have_slots():
+    doc = namumark.Namumark('T', docs[0])
+    
+    for node in doc.paragraphs.find_all(recursive = True):
+        assert not hasattr(node, '__dict__')
+    for p in doc.paragraphs:
+        assert not hasattr(p, '__dict__')
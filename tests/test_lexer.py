@@ -0,0 +1,28 @@
+import pytest
+from theseed_bot import lexer
+from helpers import sample
+
+docs = [sample(seed) for seed in range(5)]
+
+@pytest.mark.parametrize('text', docs)
+def test_tokens_cover_the_text(text):
+    tokens = lexer.tokenize(text)
+    
+    assert ''.join(text[t.start:t.end] for t in tokens) == text
+    assert all(t.start < t.end for t in tokens)
+    assert tokens == list(lexer.iter_tokens(text))
+
+def test_token_kinds():
+    kinds = [t.kind for t in lexer.tokenize("== A ==\n * [[a|b]] '''c'''\n||x||")]
+    
+    assert kinds == ['heading', 'newline', 'list', 'text', 'link_open', 'text', 'pipe', 'text', 'link_close', 'text', 'bold', 'text', 'bold', 'newline', 'table', 'text', 'cell']
+
+@pytest.mark.parametrize('text', docs)
+def test_parser_skips_text_tokens(text):
+    source = lexer.Source(text)
+    tokens = lexer.tokenize(text)
+    
+    assert lexer.text_spans(text) == [(t.start, t.end) for t in tokens if t.kind == 'text']
+    
+    for t in tokens:
+        assert source.next_markup(t.start) == (t.end if t.kind == 'text' else t.start)
@@ -0,0 +1,93 @@
+import random
+import pytest
+from theseed_bot import namumark
+from helpers import sample, nested_fragment, dump
+
+# without categories, whose duplicates are removed on load but kept by lazy parsing
+docs = [sample(seed).replace('[[분류:위키]]', '') for seed in range(20)]
+
+@pytest.mark.parametrize('text', docs)
+def test_render_round_trip(text):
+    doc = namumark.Namumark('T', text)
+    assert doc.render() == text
+    assert not doc.modified
+
+@pytest.mark.parametrize('text', docs[:5])
+def test_lazy_and_workers_give_the_same_tree(text):
+    expected = dump(namumark.Namumark('T', text).paragraphs)
+    
+    assert dump(namumark.Namumark('T', text, lazy = True).paragraphs) == expected
+    assert dump(namumark.Namumark('T', text, workers = 2).paragraphs) == expected
+
+def test_iter_sections():
+    text = docs[0]
+    sections = [dump(p.content) for p in namumark.iter_sections('T', text)]
+    
+    assert sections == [dump(p.content) for p in namumark.Namumark('T', text).paragraphs]
+
+@pytest.mark.parametrize('open, close', [('{{{#!wiki\n', '\n}}}'), ('{{{#!folding 접기\n', '\n}}}'), ('[[a|', ']]'), ('{{{#red ', '}}}')])
+def test_deep_nesting(open, close):
+    # far deeper than the recursion limit
+    depth = 5000
+    doc = namumark.Namumark('T', open * depth + 'a' + close * depth)
+    
+    assert doc.render() == open * depth + 'a' + close * depth
+    assert len(doc.paragraphs.find_all(recursive = True)) > depth
+    assert doc.paragraphs.find_all(type = 'PlainText', recursive = True)[0].content.rstrip() == 'a'
+
+@pytest.mark.parametrize('text', docs)
+def test_engines_give_the_same_tree(text):
+    fast = namumark.Namumark('T', text)
+    reference = namumark.Namumark('T', text, engine = 'reference')
+    
+    assert dump(fast.paragraphs) == dump(reference.paragraphs)
+    assert fast.render() == reference.render()
+
+# a table at the start of link content, carried over a newline past the close window
+nested = ['[[a|||b||\n||' + 'c' * 80 + '||]]'] + [nested_fragment(random.Random(seed)) for seed in range(300)]
+
+@pytest.mark.parametrize('text', nested)
+def test_engines_agree_on_nested_tables(text):
+    fast = namumark.Namumark('T', text)
+    reference = namumark.Namumark('T', text, engine = 'reference')
+    
+    assert dump(fast.paragraphs) == dump(reference.paragraphs)
+
+def test_parse_limit_leaves_raw_text():
+    text = '== A ==\n[[a]] x\n== B ==\n' + "'''[[a|''b --c {{{+1 d " * 100 + '\n'
+    doc = namumark.Namumark('T', text, max_steps = 200)
+    
+    a, b = doc.paragraphs.child
+    assert [type(node) for node in a.content] == [namumark.MarkedText]
+    assert [type(node) for node in b.content] == [namumark.RawText]
+    assert doc.render() == text
+    
+    with pytest.raises(namumark.ParseLimitError) as error:
+        namumark.Namumark('T', text, max_steps = 200, strict = True)
+    
+    assert error.value.limit == 'max_steps'
+
+def test_scan_finds_the_nodes_of_a_full_parse():
+    text = docs[1]
+    expected = [str(l) for l in namumark.Namumark('T', text, lazy = True).paragraphs.find_all(type = 'LinkedText', recursive = True)]
+    results = namumark.Namumark.scan(text, {'LinkedText'})
+    
+    assert sorted(str(r.node) for r in results) == sorted(expected)
+    for r in results:
+        assert text[r.start:r.end] == str(r.node)
+
+@pytest.mark.parametrize('text', [
+    '||<bgcolor=#fff> a || [[b]] ||\n|| [[c#d|e]] ||||\n',
+    'x {{{#!wiki style="a:b"\n[[a]] y\n[[b|c]]}}} [[d]]\n',
+    # the second row breaks the table and drops its text
+    '||a||b||\n||<tablebgcolor=red>{{|)[[a]]\n',
+    # cells starting a comment or a quote
+    '||||##||[[a]]||\n||||> ||[[b]]||\n',
+])
+def test_scan_of_tables_and_wiki_blocks(text):
+    expected = namumark.Namumark('T', text, lazy = True).paragraphs.find_all(type = 'LinkedText', recursive = True)
+    results = namumark.Namumark.scan(text, {'LinkedText'})
+    
+    assert [repr(r.node) for r in results] == [repr(l) for l in expected]
+    for r in results:
+        assert text[r.start:r.end] == str(r.node)
@@ -0,0 +1,187 @@
+import re, bisect
+from collections import namedtuple
+
+# namumark lexer: tokens of a text, and the index of them the parser uses to skip plain text
+
+Token = namedtuple('Token', ['kind', 'start', 'end'])
+
+# characters which may open or close inline markup
+markup_chars = "\n',-<[]^_{|}~"
+
+re_heading = re.compile(r'^(={1,6})(#)? (?P<title>.*) (?(2)#)\1$', flags = re.MULTILINE)
+
+# (kind, regex), tried in order at every position
+token_types = [
+    # line tokens
+    ('heading', r'^(?P<hlevel>={1,6})(?P<hhidden>\#)?\ .*\ (?(hhidden)\#)(?P=hlevel)$'),
+    ('comment', r'^\#\#.*'),
+    ('list', r'^\ +(?:\*|1\.|A\.|a\.|I\.|i\.)(?:\#[0-9]+)?'),
+    ('quote', r'^\ *>'),
+    ('hr', r'^\ *-{4,9}$'),
+    ('table', r'^\ *\|\|'),
+
+    # runs of characters which never take part in markup. no other token starts with one of them
+    # except the line tokens, so trying them first only saves time
+    ('text', '[^{}]+'.format(re.escape(markup_chars))),
+
+    # blocks
+    ('wiki_open', r'\{\{\{\#!wiki'),
+    ('folding_open', r'\{\{\{\#!folding'),
+    ('html_open', r'\{\{\{\#!html'),
+    ('style_open', r'\{\{\{\#!style'),
+    ('if_open', r'\{\{\{\#!if'),
+    ('brace_open', r'\{\{\{'),
+    ('brace_close', r'\}\}\}'),
+    ('box_open', r'\{\{\|'),
+    ('box_close', r'\|\}\}'),
+
+    # brackets
+    ('link_open', r'\[\['),
+    ('link_close', r'\]\]'),
+    ('footnote_open', r'\[\*'),
+    ('bracket_open', r'\['),
+    ('bracket_close', r'\]'),
+    ('math_open', r'<math>'),
+    ('math_close', r'</math>'),
+
+    # text styles
+    ('bold', r"'''"),
+    ('italic', r"''"),
+    ('strike', r'--|~~'),
+    ('underline', r'__'),
+    ('sup', r'\^\^'),
+    ('sub', r',,'),
+
+    ('cell', r'\|\|'),
+    ('pipe', r'\|'),
+    ('newline', r'\n'),
+
+    # markup character not forming any token
+    ('symbol', r'.'),
+]
+
+re_brace = re.compile(r'\{\{\{|\}\}\}|\n')
+re_token = re.compile('|'.join('(?P<{}>{})'.format(kind, regex) for kind, regex in token_types), flags = re.MULTILINE)
+
+def iter_tokens(text, start = 0, end = None):
+    if end == None:
+        end = len(text)
+
+    for match in re_token.finditer(text, start, end):
+        yield Token(match.lastgroup, match.start(), match.end())
+
+def text_spans(text, start = 0, end = None):
+    # (start, end) of the text tokens of iter_tokens, without building the other tokens
+    if end == None:
+        end = len(text)
+    
+    return [match.span() for match in re_token.finditer(text, start, end) if match.lastgroup == 'text']
+
+def tokenize(text, start = 0, end = None):
+    # list(iter_tokens(...)), building the tokens without the generator
+    if end == None:
+        end = len(text)
+    
+    make = Token._make
+    return [make((match.lastgroup,) + match.span()) for match in re_token.finditer(text, start, end)]
+
+class Source():
+    # token index of a text
+    def __init__(self, text):
+        self.text = text
+        self._tokens = None
+        
+        # results of parse attempts on text, filled by the parser
+        self.memo = {}
+        self.dead = {}
+        self.reused = False
+        
+        # sorted positions of markers, built on first use
+        self.positions = {}
+        
+        # position of the }}} matching the {{{ ending at a position, -1 if not on the same line
+        self.braces = {}
+        
+        # spans of text tokens, for skipping plain text, built on first use
+        self.text_starts = None
+        self.text_ends = None
+    
+    @property
+    def tokens(self):
+        if self._tokens == None:
+            self._tokens = tokenize(self.text)
+        
+        return self._tokens
+
+    # texts shorter than this are searched directly instead of being indexed
+    index_threshold = 1024
+
+    def find(self, marker, start, end = None):
+        # first position of marker (a string or compiled pattern) in text[start:end], or -1
+        if len(self.text) < self.index_threshold:
+            if isinstance(marker, str):
+                return self.text.find(marker, start, len(self.text) if end == None else end)
+            
+            match = marker.search(self.text, start, len(self.text) if end == None else end)
+            return match.start() if match else -1
+        
+        positions = self.positions.get(marker)
+        if positions == None:
+            pattern = marker.pattern if isinstance(marker, re.Pattern) else re.escape(marker)
+            flags = marker.flags if isinstance(marker, re.Pattern) else 0
+            
+            # lookahead, so overlapping occurrences are all found
+            positions = self.positions[marker] = [m.start() for m in re.finditer('(?={})'.format(pattern), self.text, flags)]
+        
+        idx = bisect.bisect_left(positions, start)
+        if idx < len(positions) and (end == None or positions[idx] < end):
+            return positions[idx]
+        
+        return -1
+
+    def match_braces(self, offset):
+        # position of the }}} closing a {{{ which ends at offset, counting nested {{{ on the same line
+        if offset in self.braces:
+            return self.braces[offset]
+        
+        stack = [offset]
+        i = offset
+        
+        while True:
+            match = re_brace.search(self.text, i)
+            if not match or match[0] == '\n':
+                break
+            
+            i = match.end()
+            
+            if match[0] == '{{{':
+                # nested {{{ matched by an earlier scan
+                end = self.braces.get(i)
+                if end == None:
+                    stack.append(i)
+                elif end < 0:
+                    break
+                else:
+                    i = end + 3
+            else:
+                self.braces[stack.pop()] = match.start()
+                if not stack:
+                    return match.start()
+        
+        for start in stack:
+            self.braces[start] = -1
+        
+        return -1
+    
+    def next_markup(self, offset):
+        # skip to the end of the text token containing offset
+        if self.text_starts == None:
+            spans = text_spans(self.text)
+            self.text_starts = [span[0] for span in spans]
+            self.text_ends = [span[1] for span in spans]
+        
+        idx = bisect.bisect_right(self.text_starts, offset) - 1
+        if idx >= 0 and self.text_ends[idx] > offset:
+            return self.text_ends[idx]
+
+        return offset
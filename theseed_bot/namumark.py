@@ -1,6 +1,9 @@
 from __future__ import annotations
-import re, copy, colorsys, webcolors, math, enum
+import re, copy, colorsys, webcolors, math, enum, time, pickle, bisect, difflib
+import concurrent.futures
+from collections import namedtuple
 from bs4 import BeautifulSoup
+from . import lexer
 
 # namumark parser
 
@@ -11,58 +14,356 @@ class Document():
         self.title = title
         self.text = text
         self.force_show_namespace = force_show_namespace
+
+class ParseLimitError(Exception):
+    # raised by the parsers when a limit given to Namumark is exceeded
+    def __init__(self, limit):
+        super().__init__(limit)
+        self.limit = limit
+
+# node found by Namumark.scan, with its span in the scanned text
+ScanResult = namedtuple('ScanResult', ['node', 'start', 'end'])
+
+# text merged by merge_hunks, with the hunks left out of it for overlapping the other changes
+MergeResult = namedtuple('MergeResult', ['text', 'conflicts'])
+    
+def run_parser(parser):
+    # run a parser generator, keeping nested parsers on an explicit stack
+    # instead of the python call stack
+    stack = [parser]
+    result = None
+    
+    while stack:
+        try:
+            nested = stack[-1].send(result)
+        except StopIteration as e:
+            stack.pop()
+            result = e.value
+        else:
+            stack.append(nested)
+            result = None
+    
+    return result
+
+class TrackedAttribute(property):
+    # attribute of a node which marks the node dirty when set after the node was parsed.
+    # the value is kept in the slot of the same name with a leading underscore, declared in the same class,
+    # and read by the getter of property without a python call
+    def __set_name__(self, owner, name):
+        self.slot = vars(owner)['_' + name]
+        super().__init__(self.slot.__get__, self.set)
+    
+    def set(self, node, value):
+        if node.start != None:
+            try:
+                old = self.slot.__get__(node)
+            except AttributeError:
+                old = None
+            
+            if not self.unchanged(old, value):
+                self.mark(node)
+        
+        self.slot.__set__(node, value)
+    
+    @staticmethod
+    def unchanged(old, value):
+        # strings, numbers and None equal to the old value. other values, such as lists, may have been changed in place
+        return (value == None or isinstance(value, (str, int))) and old == value
+    
+    def mark(self, node):
+        node.mark_dirty()
+
+class HeadingAttribute(TrackedAttribute):
+    # attribute of the heading of a paragraph, which is rendered apart from its content
+    def mark(self, node):
+        node.outline_dirty = True
+
+def mark_dirty(node):
+    # node, and the nodes and the paragraph holding it, are rendered from the tree instead of copied from the source text
+    while node != None and not node.dirty:
+        node.dirty = True
+        node = node.parent
+
+class SourceText(str):
+    # text copied from the string a node was parsed from, as source[start:start + len(text)]
+    def __new__(cls, source, start, end):
+        text = super().__new__(cls, source[start:end])
+        text.source = source
+        text.start = start
+        return text
+
+def iter_pieces(node, anchored = False):
+    # pieces of str(node) in order, expanding the render_parts of nested nodes on an explicit stack.
+    # nodes not changed since they were parsed are copied from their source text as SourceText.
+    # newlines are followed by the line_prefix of every node they are in. if anchored, changed lines are
+    # expanded and their unchanged plain text is given as SourceText too, so diff can align it
+    stack = [(iter((node,)), '')]
+    
+    while stack:
+        parts, prefix = stack[-1]
+        
+        for part in parts:
+            cls = type(part)
+            if cls is not str:
+                if cls is PlainText:
+                    part = source_plain_text(part) if anchored else str(part.content)
+                elif isinstance(part, MarkedText):
+                    text = part.source_text()
+                    if text == None:
+                        text = None if anchored else flat_text(part)
+                        if text == None:
+                            stack.append((iter(part.render_parts()), prefix + part.line_prefix))
+                            break
+                    
+                    part = text
+                elif isinstance(part, Paragraph):
+                    stack.append((iter(part.render_parts()), prefix))
+                    break
+                elif cls is not SourceText:
+                    part = str(part)
+            
+            if prefix:
+                part = part.replace('\n', '\n' + prefix)
+            
+            yield part
+        else:
+            stack.pop()
+
+def source_plain_text(node):
+    # content of a PlainText as SourceText if it is still the text it was parsed from, else as str
+    content = str(node._content)
+    parent = node.parent
+    
+    if node.start != None and isinstance(parent, MarkedText) and type(parent.source) is str and parent.source.startswith(content, node.start):
+        return SourceText(parent.source, node.start, node.start + len(content))
+    
+    return content
+
+def flat_text(node):
+    # str(node) of a changed line holding only plain text, joined without expanding it in iter_pieces, or None
+    if type(node) is not MarkedText or not node.dirty and node.source != None:
+        return None
+    
+    content = node._content
+    if type(content) is not list:
+        return None
+    
+    for c in content:
+        if type(c) is not PlainText:
+            return None
+    
+    # lines have no open and close tags
+    text = ''.join([str(c._content) for c in content])
+    
+    return ' ' * node._indent + text if node._indent else text
+
+def iter_render(node, chunk_size = 1024):
+    # str(node) in chunks of up to chunk_size pieces of iter_pieces
+    buffer = []
+    append = buffer.append
+    
+    for part in iter_pieces(node):
+        append(part)
+        
+        if len(buffer) >= chunk_size:
+            yield ''.join(buffer)
+            buffer.clear()
     
+    if buffer:
+        yield ''.join(buffer)
+
 class Paragraph():
-    def __init__(self, namumark: Namumark, title: str, level: str, hidden: bool, content: str):
+    __slots__ = ('_title', '_level', '_hidden', 'child', 'namumark', 'source', 'start', 'end', 'intro_end', '_content', 'content_source',
+        'dirty', 'outline_dirty', 'title_category_links', 'category_links')
+    
+    re_heading = lexer.re_heading
+    
+    title = HeadingAttribute()
+    level = HeadingAttribute()
+    hidden = HeadingAttribute()
+    
+    # paragraphs are held by the document, not by each other
+    parent = None
+    
+    def __init__(self, namumark: Namumark, title: str, level: str, hidden: bool, content: str, headings: list = None, start: int = 0, end: int = None):
         if not isinstance(namumark, Namumark):
             raise TypeError()
-
+        
+        # whether the content was changed after parsing, so it isn't copied from the source text
+        self.dirty = False
+        
+        # whether the heading or the list of child sections was changed after parsing
+        self.outline_dirty = False
+        
+        # string the content was last parsed from, which starts at start in the source text
+        self.content_source = None
+        
+        # the heading is set through the slots, as nothing is tracked before parsing
         if title:
-            self.title, i = MarkedText.parse_line(title, namumark)
+            try:
+                self._title, i = MarkedText.parse_line(title, namumark)
+            except ParseLimitError:
+                if namumark.strict:
+                    raise
+                
+                self._title = RawText.create(namumark, title)
         else:
-            self.title = None
+            self._title = None
         
-        self.level = level
-        self.hidden = hidden
+        self._level = level
+        self._hidden = hidden
 
         self.child = []
 
         self.namumark = namumark
-
-        self.content = content
-        self.parse()
         
-        self.content = MarkedText.parse(self.content, namumark, parent = self)
+        if end == None:
+            end = len(content)
+        
+        # span of the section body in the document text, without the heading line
+        self.source = content
+        self.start = start
+        self.end = end
+        
+        self.title_category_links = []
+        self.category_links = []
+        
+        if headings == None:
+            headings = self.scan_headings(content, start, end)
 
-    def __str__(self):
-        result = ''
+        intro = self.parse(content, headings, start, end)
         
-        for content in self.content:
-            result += str(content)
-            result += '\n'
+        if namumark.lazy:
+            self._content = None
+        else:
+            self._content = self.parse_content(intro)
+    
+    @property
+    def content(self):
+        # content set to None is parsed from the source text on first access
+        if self._content == None:
+            self.namumark.start_limits()
+            self._content = self.parse_content(self.source[self.start:self.intro_end])
+            self.namumark.sources.clear()
         
-        if self.level > 0:
-            hidden_text = '#' if self.hidden else ''
-            level_text = ''
-            for i in range(self.level):
-                level_text += '='
-            
-            title_text = '{0}{1} {2} {1}{0}\n'.format(level_text, hidden_text, self.title)
-            result = title_text + result
+        return self._content
+    
+    @content.setter
+    def content(self, content):
+        # set to None, the content is parsed again from the source text on access
+        self.dirty = False
         
-        for child in self.child:
-            result += str(child)
+        if content != None:
+            self.mark_dirty()
         
-        if self.level == 0:
-            result = result[:-1]
+        self._content = content
+    
+    def mark_dirty(self):
+        mark_dirty(self)
+    
+    def __str__(self):
+        return ''.join(iter_render(self))
+    
+    def source_text(self):
+        # content of the paragraph in the source text, without the heading and the children, or None if changed
+        if self.dirty:
+            return None
         
-        return result
+        return SourceText(self.source, self.start, self.intro_end)
+    
+    def render_heading(self):
+        # heading line as a list of parts for iter_render, the title copied from its source text if unchanged
+        hidden_text = '#' if self.hidden else ''
+        level_text = '=' * self.level
+        
+        return ['{}{} '.format(level_text, hidden_text), self.title, ' {}{}'.format(hidden_text, level_text)]
+    
+    def render_lines(self):
+        # lines of the content, as lists of parts for iter_render without the newline
+        if self._content == None:
+            # never parsed, render the source text as it is
+            text = self.source[self.start:self.intro_end]
+            if text:
+                yield [text[:-1] if text[-1] == '\n' else text]
+        else:
+            for content in self._content:
+                yield [content]
+    
+    def render_parts(self):
+        # the section and its children. every line ends with a newline, except the last one of the whole document,
+        # which keeps the newline of the source text if the content holding it is copied
+        newline = False
+        
+        for p in self:
+            if p.level > 0:
+                if newline:
+                    yield '\n'
+                
+                yield from p.render_heading()
+                newline = True
+            
+            text = p.source_text()
+            
+            if text != None:
+                # an empty content is copied with the newline ending the heading, if the source text has one
+                if newline and (text or 0 < p.start <= len(p.source) and p.source[p.start - 1] == '\n'):
+                    yield '\n'
+                    newline = False
+                
+                yield text
+                
+                if text:
+                    newline = text[-1] != '\n'
+            else:
+                # changed lines of plain text are joined into one piece, other lines are rendered by iter_render
+                buffer = []
+                
+                for line in p.render_lines():
+                    if newline:
+                        buffer.append('\n')
+                    
+                    for part in line:
+                        text = flat_text(part)
+                        
+                        if text != None:
+                            buffer.append(text)
+                        else:
+                            if buffer:
+                                yield ''.join(buffer)
+                                buffer.clear()
+                            
+                            yield part
+                    
+                    newline = True
+                
+                # the newline ending the content in the source text is kept, as with copied content
+                if newline and p.start < p.intro_end and p.source[p.intro_end - 1] == '\n':
+                    buffer.append('\n')
+                    newline = False
+                
+                if buffer:
+                    yield ''.join(buffer)
+        
+        if newline and self.level > 0:
+            yield '\n'
     
     def __repr__(self):
         return '({}, {}, {}{})'.format(repr(self.title), self.level, self.hidden, ', {}'.format(self.child) if self.child else '')
     
     def add_child(self, child):
         self.child.append(child)
+        
+        if self.start != None:
+            self.outline_dirty = True
+    
+    @property
+    def modified(self):
+        # whether the section or a section in it was changed after parsing, by the flags of the changed nodes
+        for p in self:
+            if p.dirty or p.outline_dirty or (p.title and p.title.dirty):
+                return True
+        
+        return False
     
     def find_child(self, title):
         for child in self.child:
@@ -77,37 +378,81 @@ class Paragraph():
                 return child, match
         return None
 
-    def parse(self):
-        found = False
-        content = None
-
-        for p in Namumark.h_tags:
-            start_pos = 0
-            title = None
-            hidden = False
-
-            for match in p[0].finditer(self.content):
-                if start_pos == 0:
-                    content = self.content[start_pos:match.start(0)]
-                else:
-                    self.add_child(Paragraph(self.namumark, title, p[1], hidden, self.content[start_pos:match.start(0)]))
-                
-                hidden = match[1] == '#'
-                title = match['title']
-
-                start_pos = match.end(0) + 1
+    @classmethod
+    def scan_headings(cls, text, start = 0, end = None):
+        # (start, end, level, hidden, title) of every heading line
+        if end == None:
+            end = len(text)
+        
+        return [(m.start(), m.end(), len(m[1]), m[2] == '#', m['title']) for m in cls.re_heading.finditer(text, start, end)]
 
-                found = True
+    def parse(self, text, headings, start, end):
+        # split text[start:end] on the highest level headings, and return the leading content
+        if not headings:
+            self.intro_end = end
+            return text[start:end]
+        
+        level = min(h[2] for h in headings)
+        split = [k for k, h in enumerate(headings) if h[2] == level]
+        
+        sections = []
+        for n, k in enumerate(split):
+            h = headings[k]
             
-            if found:
-                self.add_child(Paragraph(self.namumark, title, p[1], hidden, self.content[start_pos:]))
+            if n + 1 < len(split):
+                child_end = headings[split[n + 1]][0]
+                child_headings = headings[k + 1:split[n + 1]]
             else:
-                content = self.content
+                child_end = end
+                child_headings = headings[k + 1:]
             
-            if found:
-                break
+            sections.append((h[4], level, h[3], child_headings, h[1] + 1, child_end))
+        
+        if self.level == 0 and self.namumark.workers > 1 and len(sections) > 1 and not self.namumark.lazy:
+            self.child = self.namumark.parse_sections(text, sections)
+        else:
+            for title, level, hidden, child_headings, child_start, child_end in sections:
+                self.child.append(Paragraph(self.namumark, title, level, hidden, text, child_headings, child_start, child_end))
+        
+        self.intro_end = headings[split[0]][0]
+        return text[start:self.intro_end]
+    
+    def parse_content(self, text):
+        # text is left unparsed when a limit of namumark is exceeded, unless it is strict
+        self.content_source = text
+        
+        try:
+            return MarkedText.parse(text, self.namumark, parent = self)
+        except ParseLimitError:
+            if self.namumark.strict:
+                raise
+            
+            if not text:
+                return []
+            
+            raw = RawText.create(self.namumark, text[:-1] if text[-1] == '\n' else text)
+            raw.parent = self
+            return [raw]
+    
+    def match_heading(self):
+        # heading line of the section in the source text
+        return self.re_heading.match(self.source, self.source.rfind('\n', 0, self.start - 1) + 1)
+    
+    def find_section(self, start, end, level = 7):
+        # path to the deepest paragraph whose body contains text[start:end],
+        # not descending into paragraphs of the given level or above
+        for child in self.child:
+            if child.start <= start and end <= child.end and child.level < level:
+                return [self] + child.find_section(start, end, level)
+        
+        return [self]
+    
+    def collect_category_links(self, title = True):
+        # (name, link) of category links in title and content, excluding children
+        if title:
+            self.title_category_links = [(l.link, l) for l in self.title.find_all(type = 'LinkedText', namespace = '분류', escape = False)] if self.title else []
         
-        self.content = content
+        self.category_links = [(l.link, l) for content in self.content for l in content.find_all(type = 'LinkedText', namespace = '분류', escape = False)]
     
     def deepest_level(self):
         result = self.level
@@ -162,42 +507,74 @@ class Paragraph():
         return result
 
 class MarkedText():
+    # subclasses declare the attributes they add in __slots__ too, () if none
+    __slots__ = ('parent', 'namumark', 'start', 'end', 'source', 'source_end', 'dirty', '_content', '_indent')
+    
     open = None
     close = None
     multiline = False
     
-    parent = None
-    namumark = None
+    # characters one of which has to follow the open tag, None for any
+    lead = None
+    
+    content = TrackedAttribute()
+    indent = TrackedAttribute()
     
     start_newline = True
     
     name = 'MarkedText'
     
+    plain_patterns = {}
+    
     def __init__(self, namumark: Namumark, content = None, indent = 0):
-        if content == None:
-            self.content = []
-        else:
-            self.content = content
+        if not isinstance(namumark, Namumark):
+            raise TypeError()
         
+        self.parent = None
         self.namumark = namumark
-        if not isinstance(self.namumark, Namumark):
-            raise TypeError()
-
-        self.indent = indent
+        
+        # span in the parsed string, None if not parsed
+        self.start = None
+        self.end = None
+        
+        # the parsed string, and the end of the text of the node in it, without a newline or close tag ending the line
+        self.source = None
+        self.source_end = None
+        
+        # whether the node or a node in it was changed after parsing, so it isn't copied from the source text
+        self.dirty = False
+        
+        self._content = [] if content == None else content
+        self._indent = indent
+    
+    # put after every newline inside the node when rendered
+    line_prefix = ''
     
     def __str__(self):
-        result = ''
-        for _ in range(self.indent):
-            result += ' '
+        return ''.join(iter_render(self))
+    
+    def mark_dirty(self):
+        # called on changes which TrackedAttribute doesn't see, such as changes of the content list in place
+        mark_dirty(self)
+    
+    def source_text(self):
+        # text of the node in the parsed string, or None if the node was changed or not parsed
+        if self.dirty or self.source == None:
+            return None
         
-        result += '' if not self.open else self.open
+        return SourceText(self.source, self.start, self.source_end)
+    
+    def render_parts(self):
+        # pieces of the rendered node in order: strings, and nodes which iter_render renders in their place
+        yield ' ' * self.indent
+        yield self.open or ''
         
-        for c in self.content:
-            result += str(c)
-            
-        result += '' if not self.close else self.close
-            
-        return result
+        if isinstance(self.content, str):
+            yield self.content
+        else:
+            yield from self.content
+        
+        yield self.close or ''
     
     def get_content(self):
         result = ''
@@ -215,8 +592,13 @@ class MarkedText():
         return result
     
     def get_bgcolor(self):
+        node = self
         parent = self.parent
         while parent and not isinstance(parent, Paragraph):
+            if isinstance(parent, Table) and node is parent.caption:
+                # the caption is outside of the table
+                break
+            
             if isinstance(parent, TableCell) or isinstance(parent, Table):
                 if 'bgcolor' in parent.styles:
                     return parent.styles['bgcolor']
@@ -234,6 +616,7 @@ class MarkedText():
                     elif Color.pattern.match(parent.styles[key]):
                         return Color(parent.styles[key])
                 
+            node = parent
             parent = parent.parent
         
         return Namumark.default_bgcolor
@@ -243,13 +626,27 @@ class MarkedText():
     
     @classmethod
     def parse(cls, content, namumark, offset = -1, parent = None, allow_comment = True, close = None):
+        return run_parser(cls.iter_parse(content, namumark, offset, parent, allow_comment, close))
+    
+    @classmethod
+    def iter_parse(cls, content, namumark, offset = -1, parent = None, allow_comment = True, close = None, depth = 0):
         i = max(0, offset)
         result = []
         
+        # nodes kept in the memo belong to the last parse of an equal string
+        source = namumark.get_source(content)
+        source.memo.clear()
+        source.reused = False
+        
         while i < len(content):
-            p, i = cls.parse_line(content, namumark, offset = i, parent = parent, allow_comment = allow_comment, close = close)
+            p, i = yield from cls.iter_parse_line(content, namumark, offset = i, parent = parent, allow_comment = allow_comment, close = close, depth = depth + 1)
             result.append(p)
         
+        if source.reused:
+            # a failed attempt may have taken a node out of a reused one in the meantime
+            for p in result:
+                p.adopt_children()
+        
         if offset < 0:
             return result
         else:
@@ -258,6 +655,9 @@ class MarkedText():
     def preprocess(self, content, offset):
         return offset
     
+    # generator replacing preprocess, for classes running nested parsers in it
+    iter_preprocess = None
+    
     def postprocess(self, content, offset):
         return offset
     
@@ -280,29 +680,84 @@ class MarkedText():
         
         return indent, i
     
+    # openers of constructs which can carry a single line attempt over a newline
+    # (a pair of pipes may open a table at the start of the content)
+    re_multiline_open = re.compile(r'\{\{\{|\{\{\||\[\*|\[math\(|\|[^|\n]*\|', flags = re.IGNORECASE)
+    
+    # close tags are usually this close to the open tag
+    close_window = 64
+    
+    @classmethod
+    def may_close(cls, source, offset):
+        # whether an attempt at offset can ever reach its close tag, looked up in the index of source
+        start = offset + len(cls.open)
+        if source.text.find(cls.close, start, start + cls.close_window) >= 0:
+            return True
+        
+        if cls.multiline:
+            return source.find(cls.close, start) >= 0
+        
+        end = source.find('\n', start)
+        if end < 0:
+            end = len(source.text)
+        
+        if source.find(cls.close, start, end) >= 0:
+            return True
+        
+        return source.find(cls.re_multiline_open, start, end) >= 0 and source.find(cls.close, end) >= 0
+    
+    @staticmethod
+    def match_singleline(content, offset, indent):
+        # singleline class opened at offset, or None
+        for l in Namumark.singleline_dispatch.get(content[offset], ()):
+            if indent >= l.allowed_indent[0] and (indent <= l.allowed_indent[1] or l.allowed_indent[1] < 0):
+                if content.startswith(l.open, offset):
+                    return l
+        
+        return None
+    
+    @staticmethod
+    def get_plain_pattern(close):
+        # plain text pattern for close tags starting with a character unknown to the lexer
+        if close[0] not in MarkedText.plain_patterns:
+            MarkedText.plain_patterns[close[0]] = re.compile('[^{}]+'.format(re.escape(lexer.markup_chars + close[0])))
+        
+        return MarkedText.plain_patterns[close[0]]
+    
     @classmethod
     def parse_line(cls, content, namumark: Namumark, offset = 0, parent: MarkedText = None, allow_newline = False, start_newline = None, close = None, allow_comment = True, indent = 0):
+        return run_parser(cls.iter_parse_line(content, namumark, offset, parent, allow_newline, start_newline, close, allow_comment, indent))
+    
+    @classmethod
+    def iter_parse_line(cls, content, namumark: Namumark, offset = 0, parent: MarkedText = None, allow_newline = False, start_newline = None, close = None, allow_comment = True, indent = 0, depth = 0):
+        # parse_line as a generator: nested parsers are delegated with yield from, and yielded to
+        # run_parser every Namumark.delegation_depth levels instead of being called
+        if namumark.limited:
+            namumark.count_step(depth)
+        
         i = offset
         close_block = cls.close if not close else close
         multiline = cls.multiline
+        fast = namumark.engine == 'fast'
         start_newline = cls.start_newline if start_newline == None else start_newline
         
         closed = False
         linestart = offset == 0 or start_newline
         
-        indent, i = cls.check_indent(content, i)
+        length = len(content)
+        
+        if i < length and content[i] == ' ':
+            indent, i = cls.check_indent(content, i)
+        else:
+            indent = 0
         
         if cls.open:
-            assert content[offset:offset+len(cls.open)] == cls.open
+            assert content.startswith(cls.open, offset)
         
         line_cls = cls
 
-        if cls == MarkedText:
-            for l in Namumark.singlelines:
-                if indent >= l.allowed_indent[0] and (indent <= l.allowed_indent[1] or l.allowed_indent[1] < 0):
-                    if content[i:i+len(l.open)] == l.open:
-                        line_cls = l
-                        break
+        if cls == MarkedText and i < length:
+            line_cls = cls.match_singleline(content, i, indent) or cls
         
         inst = line_cls(namumark, [], indent)
         inst.parent = parent
@@ -310,7 +765,10 @@ class MarkedText():
         if line_cls.open:
             i += len(line_cls.open)
 
-        pre_result = inst.preprocess(content, i)
+        if inst.iter_preprocess:
+            pre_result = yield from inst.iter_preprocess(content, i, depth)
+        else:
+            pre_result = inst.preprocess(content, i)
         
         if pre_result == None or (line_cls == Comment and not allow_comment):
             if line_cls in Namumark.singlelines and cls == MarkedText:
@@ -325,65 +783,179 @@ class MarkedText():
         else:
             i = pre_result
 
-        while i < len(content):
-            found = False
+        source = namumark.get_source(content)
+        memo = source.memo
+        
+        if close_block and close_block[0] not in lexer.markup_chars:
+            plain = cls.get_plain_pattern(close_block)
+        else:
+            plain = None
+        
+        dispatch = Namumark.bracket_dispatch
+        plain_start = -1
+        
+        # end of the text of the node, before a newline or a close tag of the enclosing construct ending the line
+        text_end = None
+        
+        # an attempt which can only fail by not being closed fails from any loop state
+        # (position, linestart) which an earlier failed attempt with the same settings passed
+        if close_block and not allow_newline and fast:
+            dead = source.dead.setdefault((close_block, multiline, inst.close, indent), set())
+            visited = []
+        else:
+            dead = None
+        
+        while i < length:
+            if dead != None:
+                state = i + i + linestart
+                if state in dead:
+                    break
+                
+                visited.append(state)
+            
+            c = content[i]
 
-            if not multiline and content[i] == '\n':
+            if c == '\n' and not multiline:
+                if plain_start >= 0:
+                    inst.content.append(PlainText(content[plain_start:i], plain_start, inst))
+                    plain_start = -1
+                
+                text_end = i
                 i += 1
                 break
             
-            if close_block:
-                if content[i:i+len(close_block)] == close_block:
-                    closed = True
+            if close_block and content.startswith(close_block, i):
+                closed = True
+                
+                if plain_start >= 0:
+                    inst.content.append(PlainText(content[plain_start:i], plain_start, inst))
+                    plain_start = -1
+                
+                if close:
+                    text_end = i
 
-                    if close_block != '\n':
-                        i += len(close_block)
+                if close_block != '\n':
+                    i += len(close_block)
 
-                    i = inst.postprocess(content, i)
-                    break
+                i = inst.postprocess(content, i)
+                break
             
-            if not found:
-                if linestart and content[i] == '|':
-                    r, i = Table.parse_line(content, namumark, i, inst, indent = indent)
-                    if r:
-                        inst.content.append(r)
-                        found = True
+            found = False
+            
+            if linestart and c == '|':
+                key = (Table, i, indent, inst.close)
+                if fast and key in memo:
+                    r, j = memo[key]
+                    source.reused = source.reused or r != None
+                elif (depth + 1) % Namumark.delegation_depth:
+                    r, j = memo[key] = yield from Table.iter_parse_line(content, namumark, i, inst, indent = indent, depth = depth + 1)
+                else:
+                    r, j = memo[key] = yield Table.iter_parse_line(content, namumark, i, inst, indent = indent, depth = depth + 1)
+                if r:
+                    if plain_start >= 0:
+                        inst.content.append(PlainText(content[plain_start:i], plain_start, inst))
+                        plain_start = -1
+                    
+                    r.parent = inst
+                    inst.content.append(r)
+                    i = j
+                    found = True
             
             if not found:
-                for b in Namumark.brackets:
-                    if content[i:i+len(b.open)] == b.open:
-                        r, i = b.parse_line(content, namumark, i, inst, indent = indent)
+                if fast and c == '{' and content.startswith('{{{', i):
+                    candidates = Namumark.brace_classifier.classify(content, i)
+                else:
+                    candidates = dispatch.get(c, ())
+                
+                for b in candidates:
+                    if content.startswith(b.open, i):
+                        # a construct only depends on the text from i. it is parsed again only after
+                        # the attempt holding it failed, so the node can be reused
+                        key = (b, i)
+                        if fast and key in memo:
+                            r, j = memo[key]
+                            source.reused = source.reused or r != None
+                        elif fast and not b.may_close(source, i):
+                            r, j = memo[key] = None, i
+                        elif (depth + 1) % Namumark.delegation_depth:
+                            r, j = memo[key] = yield from b.iter_parse_line(content, namumark, i, inst, indent = indent, depth = depth + 1)
+                        else:
+                            r, j = memo[key] = yield b.iter_parse_line(content, namumark, i, inst, indent = indent, depth = depth + 1)
                         if r:
+                            if plain_start >= 0:
+                                inst.content.append(PlainText(content[plain_start:i], plain_start, inst))
+                                plain_start = -1
+                            
+                            r.parent = inst
                             inst.content.append(r)
+                            i = j
                             found = True
                             break
             
             linestart = False
             
             if not found:
-                if content[i] == '\n':
+                if c == '\n':
                     linestart = True
-                    
-                if len(inst.content) > 0:
-                    if isinstance(inst.content[-1], PlainText):
-                        inst.content[-1].add_char(content[i])
-                        i += 1
-                        continue
-                    
-                inst.content.append(PlainText(content[i]))
+                
+                if plain_start < 0:
+                    plain_start = i
                 i += 1
+                
+                # skip text tokens, which can't start any markup
+                if not fast:
+                    j = i
+                elif plain == None:
+                    j = source.next_markup(i)
+                else:
+                    match = plain.match(content, i)
+                    j = match.end() if match else i
+                
+                if j > i:
+                    i = j
+                    linestart = False
+        
+        if plain_start >= 0:
+            inst.content.append(PlainText(content[plain_start:i], plain_start, inst))
         
         if closed or not close_block or allow_newline:
+            inst.start, inst.end = offset, i
+            inst.source, inst.source_end = content, i if text_end == None else text_end
             return inst, i
         else:
+            if dead != None:
+                dead.update(visited)
             return None, offset
     
+    def get_children(self):
+        return self.content if self.content else ()
+    
+    def adopt_children(self):
+        # point every node below self back to the node holding it
+        for node in self:
+            if isinstance(node, Table):
+                for row in node.content:
+                    for cell in row:
+                        for line in cell.content:
+                            line.parent = cell
+            elif isinstance(node, MarkedText) and isinstance(node.content, list):
+                for child in node.content:
+                    if isinstance(child, MarkedText):
+                        child.parent = node
+    
     def __iter__(self):
-        yield self
-        if self.content:
-            for child in self.content:
-                for content in child:
-                    yield content
+        # preorder traversal on an explicit stack, so nesting depth is not limited by recursion
+        stack = [iter((self,))]
+        
+        while stack:
+            for node in stack[-1]:
+                yield node
+                
+                if isinstance(node, MarkedText):
+                    stack.append(iter(node.get_children()))
+                    break
+            else:
+                stack.pop()
     
     def filter(self, **kwargs):
         result = True
@@ -408,11 +980,13 @@ class MarkedText():
             if isinstance(self.parent, Paragraph):
                 idx = self.parent.content.index(self)
                 del self.parent.content[idx]
+                self.parent.mark_dirty()
             elif self in self.parent.content:
                 if isinstance(self.parent, TableCell):
                     return None
                 else:
                     result = self.parent.content.pop(self.parent.content.index(self))
+                    self.parent.mark_dirty()
                     if cascade and not self.parent.content and self.parent.parent:
                         self.parent.extract()
                     return result
@@ -459,6 +1033,7 @@ class MarkedText():
     def append_child(self, inst):
         self.content.append(inst)
         inst.parent = self
+        self.mark_dirty()
     
     def insert_prev(self, inst):
         if self.parent:
@@ -475,14 +1050,27 @@ class MarkedText():
             raise TypeError()
 
 class PlainText():
+    __slots__ = ('_content', 'start', 'parent')
+    
     name = 'PlainText'
     
-    def __init__(self, content):
-        self.content = content
+    content = TrackedAttribute()
+    
+    def __init__(self, content, start = None, parent = None):
+        self._content = content
+        
+        # offset in the parsed string, None if not parsed
+        self.start = start
+        
+        # node holding the text when parsed, marked dirty when the text is changed
+        self.parent = parent
     
     def __str__(self):
         return str(self.content)
     
+    def mark_dirty(self):
+        mark_dirty(self.parent)
+    
     def __repr__(self):
         return repr(self.content)
     
@@ -505,7 +1093,19 @@ class PlainText():
         
         self.content += char
 
+class RawText(MarkedText):
+    __slots__ = ()
+    
+    # text left unparsed after a parse limit was exceeded, rendered as it is
+    name = 'RawText'
+    
+    @classmethod
+    def create(cls, namumark, text):
+        return cls(namumark, [PlainText(text)] if text else [])
+
 class UnorderedList(MarkedText):
+    __slots__ = ()
+    
     name = 'UnorderedList'
 
     allowed_indent = (1, -1)
@@ -521,32 +1121,31 @@ class UnorderedList(MarkedText):
         
         return i
 
-    def __str__(self):
-        result = ''
-        for i in range(self.indent):
-            result += ' '
-        
-        result += self.open + ' '
-        
-        for c in self.content:
-            result += str(c)
-            
-        return result
+    def render_parts(self):
+        yield ' ' * self.indent
+        yield self.open + ' '
+        yield from self.content
 
 class OrderedList(MarkedText):
+    __slots__ = ('_order',)
+    
     name = 'OrderedList'
+    
+    order = TrackedAttribute()
 
     allowed_indent = (1, -1)
+    
+    re_order = re.compile(r'#([0-9]+)')
 
     def preprocess(self, content, offset):
         self.order = None
 
         i = offset
 
-        order_match = re.match(r'#([0-9]+)', content[offset:])
+        order_match = self.re_order.match(content, offset)
         if order_match:
             self.order = int(order_match[1])
-            i += order_match.end()
+            i = order_match.end()
 
         if i < len(content):
             if content[i] == ' ':
@@ -554,88 +1153,112 @@ class OrderedList(MarkedText):
         
         return i
 
-    def __str__(self):
-        result = ''
-        for i in range(self.indent):
-            result += ' '
+    def render_parts(self):
+        yield ' ' * self.indent
+        yield self.open
         
-        result += self.open
-
         if self.order != None:
-            result += '#{}'.format(self.order)
-        
-        result += ' '
+            yield '#{}'.format(self.order)
         
-        for c in self.content:
-            result += str(c)
-            
-        return result
+        yield ' '
+        yield from self.content
     
     def __repr__(self):
         return '{}({}, {}{})'.format(self.name, self.indent, '{}, '.format(self.order) if self.order else '', repr(self.content))
 
 class DecimalList(OrderedList):
+    __slots__ = ()
+    
     name = 'DecimalList'
 
     open = "1."
 
 class UpperAlphaList(OrderedList):
+    __slots__ = ()
+    
     name = 'UpperAlphaList'
 
     open = "A."
 
 class AlphaList(OrderedList):
+    __slots__ = ()
+    
     name = 'UpperAlphaList'
 
     open = "a."
 
 class UpperRomanList(OrderedList):
+    __slots__ = ()
+    
     name = 'UpperRomanList'
 
     open = "I."
 
 class RomanList(OrderedList):
+    __slots__ = ()
+    
     name = 'RomanList'
 
     open = "i."
 
 class Comment(MarkedText):
+    __slots__ = ('_comment',)
+    
     name = 'Comment'
+    
+    comment = TrackedAttribute()
 
     allowed_indent = (0, 0)
     open = '##'
+    
+    re_comment = re.compile(r'(.*)(?:\n|$)')
 
     def preprocess(self, content, offset):
-        match = re.match(r'(.*)(?:\n|$)', content[offset:])
+        match = self.re_comment.match(content, offset)
         assert match
 
         self.comment = match[1]
-        return offset + match.end() - 1
+        return match.end() - 1
     
-    def __str__(self):
-        return self.open + self.comment
+    def render_parts(self):
+        yield self.open + self.comment
     
     def __repr__(self):
         return '{}({})'.format(self.name, self.comment)
 
 class QuotedText(MarkedText):
+    __slots__ = ('line_starts', 'line_sources')
+    
     name = 'QuotedText'
 
     allowed_indent = (-1, -1)
     open = '>'
+    
+    re_line = re.compile(r'(.*)(\n|$)')
 
     def preprocess(self, content, offset):
+        return run_parser(self.iter_preprocess(content, offset))
+    
+    def iter_preprocess(self, content, offset, depth = 0):
         i = offset
         text = ''
+        
+        # where each line of the quoted text starts, in it and in content
+        self.line_starts = []
+        self.line_sources = []
 
         while i < len(content):
-            match = re.match(r'(.*)(\n|$)', content[i:])
+            match = self.re_line.match(content, i)
             
             assert match
+            self.line_starts.append(len(text))
+            self.line_sources.append(i)
             text += match[1] + '\n'
-            i += match.end()
+            i = match.end()
             
             if i >= len(content):
+                # before the newline ending the last line, which ends the quote as any other line
+                i = match.end(1)
                 break
             
             old_i = i
@@ -644,47 +1267,58 @@ class QuotedText(MarkedText):
                 i -= 1
                 break
 
-            if content[i:i+len(self.open)] != self.open:
+            if not content.startswith(self.open, i):
                 i = old_i - 1
                 break
 
             i += len(self.open)
         
-        self.content = MarkedText.parse(text, self.namumark, parent = self, allow_comment = False)
+        self.content = yield MarkedText.iter_parse(text, self.namumark, parent = self, allow_comment = False, depth = depth + 1)
         return i
     
-    def __str__(self):
-        result = ''
-        indent = ''
-
-        for i in range(self.indent):
-            indent += ' '
-        
-        for c in self.content:
-
-            result += str(c) + '\n'
+    def source_offset(self, offset):
+        # offset in the quoted text to offset in the string the quote was parsed from
+        k = bisect.bisect_right(self.line_starts, offset) - 1
+        return self.line_sources[k] + offset - self.line_starts[k]
+    
+    @property
+    def line_prefix(self):
+        return ' ' * self.indent + self.open
+    
+    def render_parts(self):
+        # iter_render puts line_prefix after the newlines
+        yield self.line_prefix
         
-        result = result[:-1]
-        return re.sub(r'^', indent + '>', result, flags = re.MULTILINE)
+        for k, c in enumerate(self.content):
+            if k > 0:
+                yield '\n'
+            
+            yield c
 
 class HorizontalLine(MarkedText):
+    __slots__ = ()
+    
     name = 'HorizontalLine'
 
     allowed_indent = (-1, -1)
     open = '----'
+    
+    re_line = re.compile(r'-{0,5}$', flags = re.MULTILINE)
 
     def preprocess(self, content, offset):
-        match = re.match(r'-{0,5}$', content[offset:], flags = re.MULTILINE)
+        match = self.re_line.match(content, offset)
 
         if not match:
             return None
         
-        return offset + match.end()
+        return match.end()
     
     def __repr__(self):
         return '{}({})'.format(self.name, self.indent)
 
 class WikiDiv(MarkedText):
+    __slots__ = ('_styles', '_dark_styles', '_lang', '_class_name')
+    
     open = "{{{#!wiki"
     close = "}}}"
     multiline = True
@@ -693,6 +1327,17 @@ class WikiDiv(MarkedText):
     
     name = 'WikiDiv'
     
+    styles = TrackedAttribute()
+    dark_styles = TrackedAttribute()
+    lang = TrackedAttribute()
+    class_name = TrackedAttribute()
+    
+    re_style = re.compile(r'.*?style="(.*?)"')
+    re_darkstyle = re.compile(r'.*?dark-style="(.*?)"')
+    re_lang = re.compile(r'.*?lang="(.*?)"')
+    re_class = re.compile(r'.*?class="(.*?)"')
+    re_newline = re.compile(r'.*\n')
+    
     def parse_css(self, text):
         result = {}
         
@@ -719,29 +1364,29 @@ class WikiDiv(MarkedText):
         self.lang = None
         self.class_name = None
     
-        match_style = re.match(r'.*?style="(.*?)"', content[offset:])
+        match_style = self.re_style.match(content, offset)
         if match_style:
             self.styles = self.parse_css(match_style[1])
-            offset += match_style.end()
+            offset = match_style.end()
         
-        match_darkstyle = re.match(r'.*?dark-style="(.*?)"', content[offset:])
+        match_darkstyle = self.re_darkstyle.match(content, offset)
         if match_darkstyle:
             self.dark_styles = self.parse_css(match_darkstyle[1])
-            offset += match_darkstyle.end()
+            offset = match_darkstyle.end()
         
-        match_lang = re.match(r'.*?lang="(.*?)"', content[offset:])
+        match_lang = self.re_lang.match(content, offset)
         if match_lang:
             self.lang = match_lang[1]
-            offset += match_lang.end()
+            offset = match_lang.end()
         
-        match_class = re.match(r'.*?class="(.*?)"', content[offset:])
+        match_class = self.re_class.match(content, offset)
         if match_class:
             self.class_name = match_class[1]
-            offset += match_class.end()
+            offset = match_class.end()
         
-        match_newline = re.match(r'.*\n', content[offset:])
+        match_newline = self.re_newline.match(content, offset)
         if match_newline:
-            offset += match_newline.end()
+            offset = match_newline.end()
         
         return offset
     
@@ -754,22 +1399,37 @@ class WikiDiv(MarkedText):
             
             self.content = [colored_text]
     
-    def __str__(self):
-        styles = ' style="' + self.render_css(self.styles) + '"'
-        if self.dark_styles:
-            styles += ' dark-style="' + self.render_css(self.dark_styles) + '"'
-        if self.lang:
-            styles += ' lang="{}"'.format(self.lang)
-        if self.class_name:
-            styles += ' class="{}"'.format(self.class_name)
+    def source_header(self):
+        # open line in the parsed string, or None if the node wasn't parsed or its attributes were changed since
+        if self.source == None:
+            return None
         
-        result = self.open + styles + "\n"
+        parsed = WikiDiv(self.namumark)
+        end = parsed.preprocess(self.source, self.start + len(self.open))
         
-        for c in self.content:
-            result += str(c)
+        if (parsed.styles, parsed.dark_styles, parsed.lang, parsed.class_name) != (self.styles, self.dark_styles, self.lang, self.class_name):
+            return None
         
-        result += self.close
-        return result
+        return SourceText(self.source, self.start, end)
+    
+    def render_parts(self):
+        # the open line is copied from the source text if only the content was changed
+        header = self.source_header()
+        
+        if header == None:
+            styles = ' style="' + self.render_css(self.styles) + '"'
+            if self.dark_styles:
+                styles += ' dark-style="' + self.render_css(self.dark_styles) + '"'
+            if self.lang:
+                styles += ' lang="{}"'.format(self.lang)
+            if self.class_name:
+                styles += ' class="{}"'.format(self.class_name)
+            
+            header = self.open + styles + "\n"
+        
+        yield header
+        yield from self.content
+        yield self.close
     
     def __repr__(self):
         attribs = []
@@ -786,6 +1446,8 @@ class WikiDiv(MarkedText):
         return '{}({}, {})'.format(self.name, ', '.join(attribs), repr(self.content))
 
 class FoldingDiv(MarkedText):
+    __slots__ = ('_title',)
+    
     open = "{{{#!folding"
     close = "}}}"
     multiline = True
@@ -794,29 +1456,30 @@ class FoldingDiv(MarkedText):
     
     name = 'FoldingDiv'
     
+    title = TrackedAttribute()
+    
+    re_title = re.compile(r' (.*?)\n')
+    
     def preprocess(self, content, offset):
-        match_style = re.match(r' (.*?)\n', content[offset:])
+        match_style = self.re_title.match(content, offset)
         if not match_style:
             return None
         
         self.title = match_style[1]
         
-        offset += match_style.end()
-        return offset
+        return match_style.end()
     
-    def __str__(self):
-        result = self.open + ' {}\n'.format(self.title)
-        
-        for c in self.content:
-            result += str(c)
-        
-        result += self.close
-        return result
+    def render_parts(self):
+        yield self.open + ' {}\n'.format(self.title)
+        yield from self.content
+        yield self.close
     
     def __repr__(self):
         return '{}(title="{}", {})'.format(self.name, self.title, repr(self.content))
     
 class ConditionalText(MarkedText):
+    __slots__ = ('_condition',)
+    
     open = "{{{#!if"
     close = "}}}"
     multiline = True
@@ -825,29 +1488,30 @@ class ConditionalText(MarkedText):
     
     name = 'ConditionalText'
     
+    condition = TrackedAttribute()
+    
+    re_condition = re.compile(r' (.*?)\n')
+    
     def preprocess(self, content, offset):
-        match_condition = re.match(r' (.*?)\n', content[offset:])
+        match_condition = self.re_condition.match(content, offset)
         if not match_condition:
             return None
         
         self.condition = match_condition[1]
         
-        offset += match_condition.end()
-        return offset
+        return match_condition.end()
     
-    def __str__(self):
-        result = self.open + ' {}\n'.format(self.condition)
-        
-        for c in self.content:
-            result += str(c)
-        
-        result += self.close
-        return result
+    def render_parts(self):
+        yield self.open + ' {}\n'.format(self.condition)
+        yield from self.content
+        yield self.close
     
     def __repr__(self):
         return '{}(condition="{}", {})'.format(self.name, self.condition, repr(self.content))
 
 class HtmlText(MarkedText):
+    __slots__ = ()
+    
     open = "{{{#!html"
     close = "}}}"
     multiline = True
@@ -874,12 +1538,15 @@ class HtmlText(MarkedText):
                 index = self.parent.content.index(self)
                 
                 self.parent.content[index] = colored_text
+                self.parent.mark_dirty()
                 
                 self.content[0].content = str(soup)
             except KeyError:
                 pass
 
 class OldBoxedText(MarkedText):
+    __slots__ = ()
+    
     open = "{{|"
     close = "|}}"
     multiline = True
@@ -888,16 +1555,14 @@ class OldBoxedText(MarkedText):
     
     name = 'OldBoxedText'
     
-    def __str__(self):
-        result = '||'
-        
-        for c in self.content:
-            result += str(c)
-        
-        result += '||'
-        return result
+    def render_parts(self):
+        yield '||'
+        yield from self.content
+        yield '||'
 
 class BoxedText(MarkedText):
+    __slots__ = ()
+    
     open = "{{{"
     close = "}}}"
     multiline = True
@@ -907,6 +1572,8 @@ class BoxedText(MarkedText):
     name = 'BoxedText'
 
 class NowikiText(MarkedText):
+    __slots__ = ()
+    
     open = "{{{"
     close = "}}}"
     multiline = False
@@ -915,35 +1582,24 @@ class NowikiText(MarkedText):
     
     name = 'NowikiText'
     
+    @classmethod
+    def may_close(cls, source, offset):
+        return source.match_braces(offset + len(cls.open)) >= 0
+    
     def preprocess(self, content, offset):
-        cnt = 1
-        i = offset
-        
-        while cnt > 0:
-            if i >= len(content):
-                return None
-                
-            if content[i] == '\n':
-                return None
-            
-            if content[i:i+3] == '{{{':
-                cnt += 1
-                i += 3
-                continue
-            elif content[i:i+3] == '}}}':
-                cnt -= 1
-                i += 3
-                continue
-                
-            i += 1
+        # matching }}} on the same line, shared with the {{{ nested in it
+        i = self.namumark.get_source(content).match_braces(offset)
+        if i < 0:
+            return None
         
-        i -= 3
         self.content = content[offset:i]
         
         return i
     
 
 class StyleDefinitionText(NowikiText):
+    __slots__ = ()
+    
     open = "{{{#!style"
     close = "}}}"
     multiline = True
@@ -953,6 +1609,8 @@ class StyleDefinitionText(NowikiText):
     name = 'StyleDefinitionText'
 
 class SizedText(MarkedText):
+    __slots__ = ('_size',)
+    
     open = "{{{"
     close = "}}}"
     multiline = False
@@ -961,29 +1619,32 @@ class SizedText(MarkedText):
     
     name = 'SizedText'
     
+    size = TrackedAttribute()
+    
+    lead = '+-'
+    
+    re_size = re.compile(r'([+-][1-6]) ')
+    
     def preprocess(self, content, offset):
-        match_style = re.match(r'([+-][1-6]) ', content[offset:])
+        match_style = self.re_size.match(content, offset)
         if not match_style:
             return None
         
         self.size = int(match_style[1])
         
-        offset += match_style.end()
-        return offset
+        return match_style.end()
     
-    def __str__(self):
-        result = self.open + '{}{} '.format('+' if self.size > 0 else '', self.size)
-        
-        for c in self.content:
-            result += str(c)
-        
-        result += self.close
-        return result
+    def render_parts(self):
+        yield self.open + '{}{} '.format('+' if self.size > 0 else '', self.size)
+        yield from self.content
+        yield self.close
     
     def __repr__(self):
         return '{}({}, {})'.format(self.name, self.size, repr(self.content))
 
 class ColoredText(MarkedText):
+    __slots__ = ('_color',)
+    
     open = "{{{"
     close = "}}}"
     multiline = True
@@ -992,11 +1653,19 @@ class ColoredText(MarkedText):
     
     name = 'ColoredText'
     
+    color = TrackedAttribute()
+    
+    lead = '#,'
+    
+    # first color requires '#' unless it starts with a comma
+    re_color = re.compile(r'(?:#[A-Za-z]+|#(?:[0-9a-fA-F]{3}|[0-9a-fA-F]{6})|,(?:[A-Za-z]+|#(?:[0-9a-fA-F]{3}|[0-9a-fA-F]{6})))(?:,(?:[A-Za-z]+|#(?:[0-9a-fA-F]{3}|[0-9a-fA-F]{6})))? ')
+    re_hexcolor = re.compile(r'#(?:[0-9a-fA-F]{3}|[0-9a-fA-F]{6})')
+    
     def preprocess(self, content, offset):
-        if not re.match(r'((?:(?:^|(,))((?(2)|#)[A-Za-z]+|#(?:[0-9a-fA-F]{3}|[0-9a-fA-F]{6}))){1,2}) ', content[offset:]):
+        if not self.re_color.match(content, offset):
             return None
         
-        if not re.match(r'#(?:[0-9a-fA-F]{3}|[0-9a-fA-F]{6})', content[offset:]):
+        if not self.re_hexcolor.match(content, offset):
             offset += 1
         
         self.color, offset = Color.parse(content, offset)
@@ -1009,25 +1678,28 @@ class ColoredText(MarkedText):
         return offset + 1
     
     def generate_dark(self, override = False):
+        color = (self.color.light, self.color.dark)
         self.color.generate_dark(bgcolor = self.get_bgcolor(), foreground = True, override = override)
+        
+        if (self.color.light, self.color.dark) != color:
+            self.mark_dirty()
     
-    def __str__(self):
-        result = self.open + '{}{} '.format('#' if str(self.color)[0] != '#' else '', self.color)
+    def render_parts(self):
+        yield self.open + '{}{} '.format('#' if str(self.color)[0] != '#' else '', self.color)
         
         if len(self.content) >= 1:
             if isinstance(self.content[0], Table):
-                result += '\n'
-        
-        for c in self.content:
-            result += str(c)
+                yield '\n'
         
-        result += self.close
-        return result
+        yield from self.content
+        yield self.close
     
     def __repr__(self):
         return '{}(color="{}", {})'.format(self.name, self.color, repr(self.content))
 
 class LinkedText(MarkedText):
+    __slots__ = ('_link', '_anchor', '_escape', '_parameters', 'type')
+    
     open = "[["
     close = "]]"
     multiline = False
@@ -1036,24 +1708,33 @@ class LinkedText(MarkedText):
     
     name = 'LinkedText'
     
+    link = TrackedAttribute()
+    anchor = TrackedAttribute()
+    escape = TrackedAttribute()
+    parameters = TrackedAttribute()
+    
+    re_link = re.compile(r'(.*?)((?<!\\)\||(?=\]\]))')
+    re_url = re.compile(r'https?://')
+    re_anchor = re.compile(r'(?<!\\)#')
+    
     def __init__(self, namumark, content = [], indent = 0, **kwargs):
         super().__init__(namumark, content, indent)
-        self.link = None
-        self.anchor = None
-        self.escape = False
-        self.parameters = None
+        self._link = None
+        self._anchor = None
+        self._escape = False
+        self._parameters = None
         self.type = 0
     
     def preprocess(self, content, offset):
-        match_link = re.match(r'(.*?)((?<!\\)\||(?=\]\]))', content[offset:])
+        match_link = self.re_link.match(content, offset)
         if not match_link:
             return None
         
         self.link = match_link[1].rstrip()
         self.anchor = None
         
-        if not re.match(r'https?://', match_link[1]):
-            anchor = re.split(r'(?<!\\)#', match_link[1], maxsplit = 1)
+        if not self.re_url.match(match_link[1]):
+            anchor = self.re_anchor.split(match_link[1], maxsplit = 1)
             
             if len(anchor) > 1:
                 self.link = anchor[0].rstrip()
@@ -1087,9 +1768,7 @@ class LinkedText(MarkedText):
                     self.escape = False
                     self.link = ':' + self.link
         
-        offset += match_link.end()
-        
-        return offset
+        return match_link.end()
     
     def postprocess(self, content, offset):
         if self.is_file:
@@ -1179,44 +1858,42 @@ class LinkedText(MarkedText):
     def is_category(self):
         return self.namespace == '분류' and not self.escape
     
-    def __str__(self):
-        result = self.open
+    def render_parts(self):
+        yield self.open
 
         if self.escape:
             if self.namespace in self.namumark.special_namespaces:
-                result += ':'
+                yield ':'
 
-        result += self.link
+        yield self.link
         
         if self.anchor:
-            result += '#' + self.anchor
+            yield '#' + self.anchor
         
         if self.is_file:
-            params = ''
-            for key, value in self.parameters.items():
-                params += key + '=' + value + '&'
+            params = '&'.join(key + '=' + value for key, value in self.parameters.items())
             
             if params:
-                result += '|' + params[:-1]
+                yield '|' + params
         elif self.content:
-            content = ''
-            for c in self.content:
-                content += str(c)
+            content = ''.join(str(c) for c in self.content)
             if content != self.link:
-                result += '|' + content
+                yield '|'
+                yield content
         
         if len(self.link) >= 1:
             if not self.content and self.link[-1] == ']':
-                result += ' '
+                yield ' '
         
-        result += self.close
-        return result
+        yield self.close
     
     def __repr__(self):
         link = '({}, anchor={})'.format(self.link, self.anchor) if self.anchor else self.link
         return '{}(link={}, {})'.format(self.name, link, repr(self.content)) if self.content else '{}({})'.format(self.name, link)
 
 class FootnoteText(MarkedText):
+    __slots__ = ('_title',)
+    
     open = "[*"
     close = "]"
     multiline = True
@@ -1225,34 +1902,37 @@ class FootnoteText(MarkedText):
     
     name = 'FootnoteText'
     
+    title = TrackedAttribute()
+    
+    re_title = re.compile(r'(.*?)(?: |(?=\]))')
+    
     def preprocess(self, content, offset):
-        match_style = re.match(r'(.*?)(?: |(?=\]))', content[offset:])
+        match_style = self.re_title.match(content, offset)
         if not match_style:
             return None
         
         self.title = match_style[1]
         
-        offset += match_style.end()
-        return offset
+        return match_style.end()
     
-    def __str__(self):
-        result = self.open
+    def render_parts(self):
+        yield self.open
         
         if self.title:
-            result += self.title
+            yield self.title
         
         if self.content:
-            result += ' '
-            for c in self.content:
-                result += str(c)
+            yield ' '
+            yield from self.content
         
-        result += self.close
-        return result
+        yield self.close
     
     def __repr__(self):
         return '{}(title="{}", {})'.format(self.name, self.title, repr(self.content)) if self.title else '{}({})'.format(self.name, self.content)
 
 class Macro(MarkedText):
+    __slots__ = ('_macro', '_parameters', '_named_parameters')
+    
     open = "["
     close = "]"
     multiline = False
@@ -1261,10 +1941,18 @@ class Macro(MarkedText):
     
     name = 'Macro'
     
+    macro = TrackedAttribute()
+    parameters = TrackedAttribute()
+    named_parameters = TrackedAttribute()
+    
+    re_macro = re.compile(r'(.*?)(?:\((.*?)(?<!\\)\))?(?=\])')
+    re_parameter = re.compile(r'(?<!\\)\s*,\s*')
+    re_named_parameter = re.compile(r'(?<!\\)=')
+    
     defined_macros = ['목차', '각주', 'tableofcontents', 'date', 'datetime', 'br', 'pagecount', 'include', 'footnote', 'age', 'dday', 'ruby', 'youtube', 'kakaotv', 'nicovideo', 'navertv', 'clearfix', 'kakaotv', 'vimeo']
     
     def preprocess(self, content, offset):
-        match_macro = re.match(r'(.*?)(?:\((.*?)(?<!\\)\))?(?=\])', content[offset:])
+        match_macro = self.re_macro.match(content, offset)
         if not match_macro:
             return None
         
@@ -1277,37 +1965,33 @@ class Macro(MarkedText):
         self.named_parameters = {}
         
         if match_macro[2]:
-            parameters = re.split(r'(?<!\\)\s*,\s*', match_macro[2])
+            parameters = self.re_parameter.split(match_macro[2])
             
             for param in parameters:
                 if '=' in param and len(self.parameters) > 0:
-                    named_param = re.split(r'(?<!\\)=', param, maxsplit = 1)
+                    named_param = self.re_named_parameter.split(param, maxsplit = 1)
                     if len(named_param) > 1:
                         self.named_parameters[named_param[0]] = named_param[1]
                         self.parameters.append((named_param[0], True))
                 else:
                     self.parameters.append((param, False))
         
-        offset += match_macro.end()
-        
-        return offset
+        return match_macro.end()
     
-    def __str__(self):
-        result = self.open + self.macro
+    def render_parts(self):
+        yield self.open + self.macro
         
         if self.parameters:
-            result += '('
+            params = []
             for p, named in self.parameters:
                 if not named:
-                    result += str(p) + ', '
+                    params.append(str(p))
                 else:
-                    result += str(p) + '=' + str(self.named_parameters[p]) + ', '
-                
-            result = result[:-2]
-            result += ')'
+                    params.append(str(p) + '=' + str(self.named_parameters[p]))
+            
+            yield '(' + ', '.join(params) + ')'
         
-        result += self.close
-        return result
+        yield self.close
     
     def __getitem__(self, idx):
         if isinstance(idx, str):
@@ -1319,6 +2003,8 @@ class Macro(MarkedText):
             raise KeyError
     
     def __setitem__(self, idx, value):
+        self.mark_dirty()
+        
         if isinstance(idx, str):
             self.named_parameters[idx] = value
             if idx not in self.named_parameters.keys():
@@ -1355,13 +2041,28 @@ class Macro(MarkedText):
         return '{}({}, {})'.format(self.name, self.macro, self.parameters) if self.parameters else '{}({})'.format(self.name, self.macro)
 
 class MathText(MarkedText):
+    __slots__ = ('_math',)
+    
     open = '['
     close = ']'
     
     name = 'MathText'
+    
+    math = TrackedAttribute()
+    
+    re_math = re.compile(r'(.*?)(?:\((.*?)(?<!\\)\))?(?=\])', flags = re.DOTALL)
+    
+    @classmethod
+    def may_close(cls, source, offset):
+        # only [math(...)] is accepted by preprocess, and re_math matches over newlines
+        start = offset + len(cls.open)
+        if source.text[start:start + 4].lower() != 'math':
+            return False
+        
+        return source.find(cls.close, start) >= 0
 
     def preprocess(self, content, offset):
-        match_math = re.match(r'(.*?)(?:\((.*?)(?<!\\)\))?(?=\])', content[offset:], flags = re.DOTALL)
+        match_math = self.re_math.match(content, offset)
 
         if not match_math:
             return None
@@ -1373,29 +2074,39 @@ class MathText(MarkedText):
 
         self.math = match_math[2]
 
-        return offset + match_math.end()
+        return match_math.end()
     
-    def __str__(self):
-        return '[math({})]'.format(self.math)
+    def render_parts(self):
+        yield '[math({})]'.format(self.math)
     
     def __repr__(self):
         return '{}({})'.format(self.name, repr(self.math))
 
 class OldMathText(MathText):
+    __slots__ = ()
+    
     open = '<math>'
     close = '</math>'
+    
+    re_math = re.compile(r'(.*?)(?=</math>)')
+    
+    @classmethod
+    def may_close(cls, source, offset):
+        return super(MathText, cls).may_close(source, offset)
 
     def preprocess(self, content, offset):
-        match_math = re.match(r'(.*?)(?=</math>)', content[offset:])
+        match_math = self.re_math.match(content, offset)
 
         if not match_math:
             return None
 
         self.math = match_math[1]
 
-        return offset + match_math.end()
+        return match_math.end()
 
 class Table(MarkedText):
+    __slots__ = ('_styles', '_caption', '_comments', '_style_order', 'cache_colcount')
+    
     open = None
     close = None
     multiline = True
@@ -1403,6 +2114,11 @@ class Table(MarkedText):
     start_newline = False
     
     name = 'Table'
+    
+    styles = TrackedAttribute()
+    caption = TrackedAttribute()
+    comments = TrackedAttribute()
+    style_order = TrackedAttribute()
 
     re_color = re.compile(r'((?:(?:^|,)([A-Za-z]+|#(?:[0-9a-fA-F]{3}|[0-9a-fA-F]{6}))){1,2})$')
     re_length = re.compile(r'^[0-9]+(\.[0-9]+)?(%|px)?$')
@@ -1424,6 +2140,9 @@ class Table(MarkedText):
         (re.compile(r'^colkeepall$'), ('colkeepall', None)),
         (re_color, 'bgcolor')
     ]
+    
+    # special_style_types in one pattern, alternative k named type<k>
+    re_special_style = re.compile('|'.join('(?P<type{}>{})'.format(k, t[0].pattern) for k, t in enumerate(special_style_types)))
 
     global_style_types = {
         'width': re_length, 
@@ -1455,17 +2174,17 @@ class Table(MarkedText):
         
         self.cache_colcount = None
     
-    def __iter__(self):
-        yield self
-
+    # text up to the closing || of a cell, which contains no markup
+    re_plain_cell = re.compile(r'[^{}]*\|\|'.format(re.escape(lexer.markup_chars)))
+    
+    def get_children(self):
         if self.caption:
-            for i in self.caption:
-                yield i
+            yield self.caption
         
         for row in self.content:
             for cell in row:
-                for i in cell:
-                    yield i
+                for content in cell.content:
+                    yield content
     
     @classmethod
     def parse_caption(cls, content, namumark, offset = 0):
@@ -1476,8 +2195,8 @@ class Table(MarkedText):
         styles = {}
         i = offset
         
-        while i < len(content):
-            match_style = self.re_tablestyle.match(content[i:])
+        while i < len(content) and content[i] == '<':
+            match_style = self.re_tablestyle.match(content, i)
             if not match_style:
                 break
             
@@ -1491,7 +2210,7 @@ class Table(MarkedText):
 
                                 self.styles[match_style[2]] = match_style[5]
                 
-                                i += match_style.end()
+                                i = match_style.end()
                                 continue
                     break
                 elif match_style[2] in self.style_types:
@@ -1503,28 +2222,27 @@ class Table(MarkedText):
                     else:
                         break
             else:
-                matched = False
-                for style_info in self.special_style_types:
-                    match = style_info[0].search(match_style[2])
-                    if match:
-                        for k in range(1, len(style_info)):
-                            if isinstance(style_info[k], str):
-                                if first:
-                                    self.style_order.append(style_info[k])
+                # first of special_style_types matching, told by the named group
+                match = self.re_special_style.search(match_style[2])
+                if not match:
+                    break
+                
+                style_info = self.special_style_types[int(match.lastgroup[4:])]
+                group = match.lastindex
+                
+                for k in range(1, len(style_info)):
+                    if isinstance(style_info[k], str):
+                        if first:
+                            self.style_order.append(style_info[k])
 
-                                styles[style_info[k]] = match[k]
-                            else:
-                                if first:
-                                    self.style_order.append(style_info[k][0])
+                        styles[style_info[k]] = match[group + k]
+                    else:
+                        if first:
+                            self.style_order.append(style_info[k][0])
 
-                                styles[style_info[k][0]] = style_info[k][1]
-                        matched = True
-                        break
-                        
-                if not matched:
-                    break
+                        styles[style_info[k][0]] = style_info[k][1]
                 
-            i += match_style.end()
+            i = match_style.end()
         
         for k in styles.keys():
             if len(k) >= 5:
@@ -1535,6 +2253,13 @@ class Table(MarkedText):
     
     @classmethod
     def parse_line(cls, content, namumark, offset = 0, parent = None, indent = 0):
+        return run_parser(cls.iter_parse_line(content, namumark, offset, parent, indent))
+    
+    @classmethod
+    def iter_parse_line(cls, content, namumark, offset = 0, parent = None, indent = 0, depth = 0):
+        if namumark.limited:
+            namumark.count_step(depth)
+        
         i = offset
         
         new_row = False
@@ -1553,9 +2278,11 @@ class Table(MarkedText):
         # check caption
         try:
             if not content[i+1] == '|':
-                inst.caption, i = cls.parse_caption(content, namumark, i)
+                inst.caption, i = yield MarkedText.iter_parse_line(content, namumark, i + 1, close = '|', depth = depth + 1)
                 if not inst.caption:
                     return None, offset
+                
+                inst.caption.parent = inst
             else:
                 i += 2
         except IndexError:
@@ -1565,8 +2292,25 @@ class Table(MarkedText):
         
         colinfo = []
         col_num = 0
+        
+        # start of the cell being parsed, after the || closing the previous cell or opening the row
+        cell_start = i
+        
+        # after the first cell, whether the table breaks only depends on the position and new_row,
+        # so a state passed by an earlier broken table with the same settings breaks again
+        dead = namumark.get_source(content).dead.setdefault((cls, indent, parent.close if parent else None), set())
+        visited = []
+        fast = namumark.engine == 'fast'
 
         while i < len(content):
+            if not first and fast:
+                state = i + i + new_row
+                if state in dead:
+                    dead.update(visited)
+                    return None, offset
+                
+                visited.append(state)
+            
             comment = None
 
             if content[i] == '\n':
@@ -1574,16 +2318,18 @@ class Table(MarkedText):
                 i += 1
                 
                 # check comment
-                if content[i:i+2] == Comment.open:
-                    comment, i = Comment.parse_line(content, namumark, i)
+                if content.startswith(Comment.open, i):
+                    comment, i = yield Comment.iter_parse_line(content, namumark, i, depth = depth + 1)
+                    comment.parent = inst
                     inst.comments.append((comment, len(inst.content)))
                 
                 # check indentation
                 indent_check, i = cls.check_indent(content, i, check = indent)
                 
                 if indent_check:
-                    if content[i:i+2] == '||':
+                    if content.startswith('||', i):
                         i += 2
+                        cell_start = i
                     else:
                         i = old_i
                         break
@@ -1594,11 +2340,11 @@ class Table(MarkedText):
             
             if parent:
                 if parent.close:
-                    if content[i:i+len(parent.close)] == parent.close:
+                    if content.startswith(parent.close, i):
                         break
             
             # process old colspan
-            if content[i:i+2] == '||':
+            if content.startswith('||', i):
                 colspan += 1
                 
                 i += 2
@@ -1629,9 +2375,26 @@ class Table(MarkedText):
             old_i = i
 
             cell_finished = False
+            
+            # cell without markup, taken as it is
+            match = cls.re_plain_cell.match(content, i) if fast else None
+            if match and not MarkedText.match_singleline(content, i, 0):
+                c = MarkedText(namumark, [], 0)
+                if match.end() - 2 > i:
+                    c.content.append(PlainText(content[i:match.end()-2], i, c))
+                
+                c.start, c.end = i, match.end()
+                c.source, c.source_end = content, match.end() - 2
+                cell.append(c)
+                
+                i = match.end()
+                cell_finished = True
 
-            while i < len(content):
-                c, i = MarkedText.parse_line(content, namumark, i, allow_newline = True, close = '||', start_newline = content[i-1] == '\n')
+            while i < len(content) and not cell_finished:
+                if (depth + 1) % Namumark.delegation_depth:
+                    c, i = yield from MarkedText.iter_parse_line(content, namumark, i, allow_newline = True, close = '||', start_newline = content[i-1] == '\n', depth = depth + 1)
+                else:
+                    c, i = yield MarkedText.iter_parse_line(content, namumark, i, allow_newline = True, close = '||', start_newline = content[i-1] == '\n', depth = depth + 1)
                 cell.append(c)
 
                 if not c:
@@ -1655,12 +2418,14 @@ class Table(MarkedText):
                     
                     if align_left:
                         if len(cell[-1].content) > 0:
-                            if isinstance(cell[-1].content[-1], PlainText):
-                                temp = cell[-1].content[-1].content.rstrip()
+                            text = cell[-1].content[-1]
+                            if isinstance(text, PlainText):
+                                temp = text.content.rstrip()
                                 if not temp:
                                     del cell[-1].content[-1]
                                 else:
-                                    cell[-1].content[-1].content = temp
+                                    # replaced, not changed, so the line is still copied from the source text
+                                    cell[-1].content[-1] = PlainText(temp, text.start, text.parent)
                     
                     if align_right and align_left:
                         styles['gapalign'] = 'center'
@@ -1681,6 +2446,7 @@ class Table(MarkedText):
             else:
                 if cell == None:
                     # broken table
+                    dead.update(visited)
                     return None, offset
                 
             # process rowspan
@@ -1718,6 +2484,7 @@ class Table(MarkedText):
                     colinfo.extend([rowspan for k in range(col_num + colspan - len(colinfo))])
             
             cell_inst = TableCell(inst, styles, cell, current_col)
+            cell_inst.start, cell_inst.end = cell_start, i
             for c in cell:
                 c.parent = cell_inst
             
@@ -1734,12 +2501,15 @@ class Table(MarkedText):
             
             colspan = 1
             first = False
+            cell_start = i
         
         for k in inst.styles.keys():
             if len(k) >= 5:
                 if k[-5:] == 'color':
                     inst.styles[k] = Color.parse(inst.styles[k])
-            
+        
+        inst.start, inst.end = offset, i
+        inst.source, inst.source_end = content, i
         return inst, i
     
     def process_style(self, type, style):
@@ -1751,128 +2521,177 @@ class Table(MarkedText):
             else:
                 return '<{}={}>'.format(type, style)
     
-    def __str__(self):
-        result = '||'
+    def mark_dirty(self):
+        # styles of the table are rendered in its first cell, so every cell is rendered again
+        for row in self.content:
+            for cell in row:
+                cell.dirty = True
+                cell.styles_dirty = True
+        
+        mark_dirty(self)
+    
+    def render_parts(self):
+        cells = [cell for row in self.content for cell in row]
+        
+        if self.source != None and all(cell.start != None for cell in cells) and not all(cell.styles_dirty for cell in cells) and not any(comment.dirty for comment, row in self.comments):
+            # only cells were changed. the others are copied from the source text, with the text between cells
+            i = self.start
+            
+            if self.caption and self.caption.dirty:
+                yield '|'
+                yield self.caption
+                yield '|'
+                
+                i = cells[0].start
+            
+            for k, cell in enumerate(cells):
+                if cell.dirty:
+                    yield SourceText(self.source, i, cell.start)
+                    yield from self.render_cell(cell, k == 0)
+                    i = cell.end
+            
+            yield SourceText(self.source, i, self.source_end)
+            return
+        
         if self.caption:
-            result = '|{}|'.format(self.caption)
+            yield '|'
+            yield self.caption
+            yield '|'
+        else:
+            yield '||'
         
         first = True
-        style_order = copy.deepcopy(self.style_order)
-        
         row_num = 0
         
         for row in self.content:
             for comment in self.comments:
                 if row_num == comment[1]:
-                    result += '\n{}'.format(comment[0])
+                    yield '\n'
+                    yield comment[0]
             
             if not first:
-                result += '\n'
-                for i in range(self.indent):
-                    result += ' '
-                result += '||'
+                yield '\n' + ' ' * self.indent + '||'
             for cell in row:
-                front_align_str = ''
-                back_align_str = ''
-                
-                style_str = ''
-                
-                # apply colspan, rowspan, stated alignments
-                for type, style in cell.styles.items():
-                    if type == 'colspan':
-                        if int(style) > 1:
-                            style_str += '<-{}>'.format(style)
-                    elif type == 'rowspan':
-                        if 'valign' not in cell.styles:
-                            if int(style) > 1:
-                                style_str += '<|{}>'.format(style)
-                        elif cell.styles['valign'] == 'top':
-                            style_str += '<^|{}>'.format(style)
-                        elif cell.styles['valign'] == 'bottom':
-                            style_str += '<v|{}>'.format(style)
-                    elif type == 'align':
-                        if cell.styles['align'] == 'right':
-                            style_str += '<)>'
-                        elif cell.styles['align'] == 'center':
-                            style_str += '<:>'
-                        elif cell.styles['align'] == 'left':
-                            style_str += '<(>'
-                
-                if first:
-                    # apply global styles
-                    if 'colspan' in style_order:
-                        style_order.pop(style_order.index('colspan'))
-                    if 'rowspan' in style_order:
-                        style_order.pop(style_order.index('rowspan'))
-                    if 'valign' in style_order:
-                        style_order.pop(style_order.index('valign'))
-                    if 'align' in style_order:
-                        style_order.pop(style_order.index('align'))
-                    if 'gapalign' in style_order:
-                        style_order.pop(style_order.index('gapalign'))
-                
-                    processed = []
-                    for type in style_order:
-                        match_tablestyle = re.match(r'table ?(.*)', type)
-                        if match_tablestyle:
-                            table_type = match_tablestyle[1]
-                            
-                            if table_type in self.styles:
-                                processed.append('table' + table_type)
-                        
-                                style_str += '<{}={}>'.format(type, self.styles[table_type])
-                        else:
-                            if type in cell.styles:
-                                processed.append(type)
-                                style_str += self.process_style(type, cell.styles[type])
-                    
-                    for type, style in self.styles.items():
-                        if not 'table' + type in processed:
-                            style_str = style_str + '<table{}={}>'.format(type, style)
-                
-                            
-                # apply styles
-                for type, style in cell.styles.items():
-                    if first:
-                        if type in processed:
-                            continue
-                            
-                    style_str += self.process_style(type, style)
-                
-                # apply gap alignments
-                for type, style in cell.styles.items():
-                    if type == 'gapalign':
-                        if style == 'right' or style == 'center':
-                            front_align_str += ' '
-                        if style == 'left' or style == 'center':
-                            back_align_str += ' '
-                        break
-                
-                content = ''
-                for c in cell.content:
-                    content += str(c) + '\n'
-                
-                if len(content) > 0:
-                    content = content[:-1]
-                
-                if not content:
-                    content = ' '
-                elif content[0] == '\n' and not style_str:
-                    # exceptional case
-                    style_str = '<(>'
-                
-                if content[0] == ' ':
-                    front_align_str = ''
-                
-                if content[-1] == ' ':
-                    back_align_str = ''
-                
-                result += style_str + front_align_str + content + back_align_str + '||'
+                yield from self.render_cell(cell, first)
                 first = False
             
             row_num += 1
+    
+    def render_cell(self, cell, first = False):
+        # styles, content and closing || of a cell. the first cell has the styles of the table
+        content = '\n'.join(str(c) for c in cell.content)
         
-        return result
+        if not cell.styles_dirty and cell.start != None and content and content[0] != '\n':
+            # only nodes in the cell were changed, so the styles and the gap alignments are copied from the source text
+            content_start = cell.content[0].start
+            close = cell.end - 2
+            
+            padding = close
+            while padding > content_start and self.source[padding - 1] == ' ':
+                padding -= 1
+            
+            # a changed last line is stripped of the spaces, and a line copied from the source text ends with them
+            padding = min(padding + len(content) - len(content.rstrip(' ')), close)
+            
+            yield SourceText(self.source, cell.start, content_start)
+            yield content
+            yield SourceText(self.source, padding, cell.end)
+            return
+        
+        front_align_str = ''
+        back_align_str = ''
+        
+        style_str = ''
+        
+        # apply colspan, rowspan, stated alignments
+        for type, style in cell.styles.items():
+            if type == 'colspan':
+                if int(style) > 1:
+                    style_str += '<-{}>'.format(style)
+            elif type == 'rowspan':
+                if 'valign' not in cell.styles:
+                    if int(style) > 1:
+                        style_str += '<|{}>'.format(style)
+                elif cell.styles['valign'] == 'top':
+                    style_str += '<^|{}>'.format(style)
+                elif cell.styles['valign'] == 'bottom':
+                    style_str += '<v|{}>'.format(style)
+            elif type == 'align':
+                if cell.styles['align'] == 'right':
+                    style_str += '<)>'
+                elif cell.styles['align'] == 'center':
+                    style_str += '<:>'
+                elif cell.styles['align'] == 'left':
+                    style_str += '<(>'
+        
+        if first:
+            style_order = copy.deepcopy(self.style_order)
+            
+            # apply global styles
+            if 'colspan' in style_order:
+                style_order.pop(style_order.index('colspan'))
+            if 'rowspan' in style_order:
+                style_order.pop(style_order.index('rowspan'))
+            if 'valign' in style_order:
+                style_order.pop(style_order.index('valign'))
+            if 'align' in style_order:
+                style_order.pop(style_order.index('align'))
+            if 'gapalign' in style_order:
+                style_order.pop(style_order.index('gapalign'))
+            
+            processed = []
+            for type in style_order:
+                match_tablestyle = re.match(r'table ?(.*)', type)
+                if match_tablestyle:
+                    table_type = match_tablestyle[1]
+                    
+                    if table_type in self.styles:
+                        processed.append('table' + table_type)
+                        
+                        style_str += '<{}={}>'.format(type, self.styles[table_type])
+                else:
+                    if type in cell.styles:
+                        processed.append(type)
+                        style_str += self.process_style(type, cell.styles[type])
+            
+            for type, style in self.styles.items():
+                if not 'table' + type in processed:
+                    style_str = style_str + '<table{}={}>'.format(type, style)
+        
+        
+        # apply styles
+        for type, style in cell.styles.items():
+            if first:
+                if type in processed:
+                    continue
+            
+            style_str += self.process_style(type, style)
+        
+        # apply gap alignments
+        for type, style in cell.styles.items():
+            if type == 'gapalign':
+                if style == 'right' or style == 'center':
+                    front_align_str += ' '
+                if style == 'left' or style == 'center':
+                    back_align_str += ' '
+                break
+        
+        # the styles depend on the rendered content
+        if not content:
+            content = ' '
+        elif content[0] == '\n' and not style_str:
+            # exceptional case
+            style_str = '<(>'
+        
+        if content[0] == ' ':
+            front_align_str = ''
+        
+        if content[-1] == ' ':
+            back_align_str = ''
+        
+        yield style_str + front_align_str
+        yield content
+        yield back_align_str + '||'
     
     def get_string(self):
         return ''
@@ -1889,7 +2708,13 @@ class Table(MarkedText):
         
         return self.cache_colcount
     
+    def style_state(self):
+        # styles of the table and its cells as they are rendered, to mark the table dirty only if a method changed them.
+        # a colspan of one cell isn't rendered
+        return repr(self.styles), [repr({k: v for k, v in cell.styles.items() if k != 'colspan' or int(v) > 1}) for row in self.content for cell in row]
+    
     def compress(self, recompress_color = False):
+        state = self.style_state()
         columns = []
         
         for row in self.content:
@@ -1923,9 +2748,13 @@ class Table(MarkedText):
             self.decompress_color('bgcolor')
         self.compress_color('color')
         self.compress_color('bgcolor')
+        
+        if self.style_state() != state:
+            self.mark_dirty()
     
     def decompress_color(self, type):
         assert type == 'bgcolor' or type == 'color'
+        state = self.style_state()
         
         # override column styles
         col_colors = [None for i in range(self.get_colcount())]
@@ -1965,9 +2794,13 @@ class Table(MarkedText):
                         cell.styles[type] = self.styles[type]
             
             del self.styles[type]
+        
+        if self.style_state() != state:
+            self.mark_dirty()
      
     def compress_color(self, type):
         assert type == 'bgcolor' or type == 'color'
+        state = self.style_state()
         
         # check default color
         if type == 'color':
@@ -2117,7 +2950,12 @@ class Table(MarkedText):
                                     first = False
                             break
         
+        if self.style_state() != state:
+            self.mark_dirty()
+        
     def generate_dark(self, override = False):
+        state = self.style_state()
+        
         for type, style in self.styles.items():
             if type == 'bgcolor':
                 style.generate_dark(override = override)
@@ -2157,6 +2995,9 @@ class Table(MarkedText):
                                 else:
                                     style.generate_dark(bgcolor = bgcolor, foreground = True, override = override)
                     background = False
+        
+        if self.style_state() != state:
+            self.mark_dirty()
                     
     
     def filter(self, **kwargs):
@@ -2171,20 +3012,48 @@ class Table(MarkedText):
         return result
     
     def compress_align(self):
+        changed = False
+        
         for row in self.content:
             for cell in row:
                 if 'align' in cell.styles:
                     cell.styles['gapalign'] = cell.styles.pop('align')
+                    changed = True
+        
+        if changed:
+            self.mark_dirty()
 
     def __repr__(self):
         return '{}({},{})'.format(self.name, self.styles, repr(self.content))
 
 class TableCell():
+    __slots__ = ('parent', '_styles', '_content', 'column', 'start', 'end', 'dirty', 'styles_dirty')
+    
+    styles = TrackedAttribute()
+    content = TrackedAttribute()
+    
     def __init__(self, parent, styles, content, column):
         self.parent = parent
-        self.styles = styles
-        self.content = content
+        self._styles = styles
+        self._content = content
         self.column = column
+        
+        # span from after the || before the cell to after its closing || in the string the table was parsed from,
+        # None if not parsed
+        self.start = None
+        self.end = None
+        
+        # whether the cell was changed after parsing, so it isn't copied from the source text
+        self.dirty = False
+        
+        # whether the cell itself or the table was changed, rather than only nodes in the cell, so its styles
+        # and gap alignments aren't copied from the source text either
+        self.styles_dirty = False
+    
+    def mark_dirty(self):
+        # changes of nodes in the cell mark it dirty without calling this
+        self.styles_dirty = True
+        mark_dirty(self)
     
     def __repr__(self):
         return 'TableCell({},{},{})'.format(self.column, self.styles, repr(self.content))
@@ -2227,55 +3096,71 @@ class TableCell():
         return rowspan
 
 class SimpleMarkedText(MarkedText):
+    __slots__ = ()
+    
     multiline = False
     
     start_newline = False
 
 class BoldText(SimpleMarkedText):
+    __slots__ = ()
+    
     open = "'''"
     close = "'''"
     
     name = 'BoldText'
 
 class ItalicText(SimpleMarkedText):
+    __slots__ = ()
+    
     open = "''"
     close = "''"
     
     name = 'ItalicText'
 
 class StrikedText(SimpleMarkedText):
+    __slots__ = ()
+    
     open = '--'
     close = '--'
     
     name = 'StrikedText'
 
 class StrikedText2(StrikedText):
+    __slots__ = ()
+    
     open = '~~'
     close = '~~'
 
 class UnderlinedText(SimpleMarkedText):
+    __slots__ = ()
+    
     open = '__'
     close = '__'
     
     name = 'UnderlinedText'
 
 class UpperText(SimpleMarkedText):
+    __slots__ = ()
+    
     open = '^^'
     close = '^^'
     
     name = 'UpperText'
 
 class LowerText(SimpleMarkedText):
+    __slots__ = ()
+    
     open = ',,'
     close = ',,'
     
     name = 'LowerText'
 
 class Color():
-    light = None
-    dark = None
+    __slots__ = ('light', 'dark')
     
-    pattern = re.compile(r'(?:(?:^|,)([A-Za-z]+|#(?:[0-9a-fA-F]{6}|[0-9a-fA-F]{3}))){1,2}')
+    pattern = re.compile(r',?([A-Za-z]+|#(?:[0-9a-fA-F]{6}|[0-9a-fA-F]{3}))(?:,([A-Za-z]+|#(?:[0-9a-fA-F]{6}|[0-9a-fA-F]{3})))?')
+    re_separator = re.compile(r'(?<!\\),')
     
     def __init__(self, light, dark = None):
         self.light = light
@@ -2375,7 +3260,7 @@ class Color():
             offset = 0
             return_offset = False
             
-        match_color = cls.pattern.match(content[offset:])
+        match_color = cls.pattern.match(content, offset)
         
         if not match_color:
             if return_offset:
@@ -2383,7 +3268,7 @@ class Color():
             else:
                 return None
         
-        colors = re.split(r'(?<!\\),', match_color[0])
+        colors = cls.re_separator.split(match_color[0])
         
         light = colors[0]
         dark = None
@@ -2392,7 +3277,7 @@ class Color():
             dark = colors[1]
         
         if return_offset:
-            return cls(light, dark), offset + match_color.end()
+            return cls(light, dark), match_color.end()
         else:
             return cls(light, dark)
 
@@ -2402,6 +3287,8 @@ class CategoryPosition(enum.Enum):
     BOTTOM = 2
 
 class Category():
+    __slots__ = ('_link', '_blur', '_alt', '_position', '_link_object')
+    
     def __init__(self, link, blur = False, alt = None, position = CategoryPosition.KEEP, link_object = None):
         self._link = link
         self._blur = blur
@@ -2489,17 +3376,245 @@ class Category():
         
         return l
 
-class Namumark():
-    h_tags = [
-        # regex, level
-        (re.compile(r'^=(#)? (?P<title>.*) (?(1)#)=$', flags=re.MULTILINE), 1),
-        (re.compile(r'^==(#)? (?P<title>.*) (?(1)#)==$', flags=re.MULTILINE), 2),
-        (re.compile(r'^===(#)? (?P<title>.*) (?(1)#)===$', flags=re.MULTILINE), 3),
-        (re.compile(r'^====(#)? (?P<title>.*) (?(1)#)====$', flags=re.MULTILINE), 4),
-        (re.compile(r'^=====(#)? (?P<title>.*) (?(1)#)=====$', flags=re.MULTILINE), 5),
-        (re.compile(r'^======(#)? (?P<title>.*) (?(1)#)======$', flags=re.MULTILINE), 6),
-    ]
+def build_dispatch(classes):
+    # map first character of open tag to candidate classes, keeping priority order
+    result = {}
+    
+    for c in classes:
+        result.setdefault(c.open[0], []).append(c)
+    
+    return {k: tuple(v) for k, v in result.items()}
+
+class BraceClassifier():
+    # tells apart the constructs opened by {{{ from what follows it (#!keyword, +n/-n, #color or
+    # nothing), so only the classes which can match are tried
+    def __init__(self, classes):
+        self.classes = [c for c in classes if c.open[0] == '{']
+        
+        keywords = {c.open[3:] for c in self.classes if c.open.startswith('{{{') and len(c.open) > 3}
+        self.re_keyword = re.compile('|'.join(re.escape(k) for k in sorted(keywords, key = len, reverse = True)) or '(?!)')
+        
+        self.candidates = {}
+    
+    @staticmethod
+    def accepts(cls, keyword, lead):
+        if not cls.open.startswith('{{{'):
+            return True
+        
+        if not keyword.startswith(cls.open[3:]):
+            return False
+        
+        return cls.lead == None or (lead != '' and lead in cls.lead)
+    
+    def classify(self, content, offset):
+        # candidate classes for the {{{ at offset, in priority order
+        match = self.re_keyword.match(content, offset + 3)
+        key = (match[0] if match else '', content[offset+3:offset+4])
+        
+        if key not in self.candidates:
+            self.candidates[key] = tuple(c for c in self.classes if self.accepts(c, *key))
+        
+        return self.candidates[key]
+
+def common_prefix_length(a, b):
+    # length of the common prefix of two strings, comparing slices of growing length
+    n = min(len(a), len(b))
+    i = 0
+    step = 64
+    
+    while i < n:
+        j = min(i + step, n)
+        
+        if a[i:j] != b[i:j]:
+            # bisect the first different slice
+            while j - i > 1:
+                m = (i + j) // 2
+                if a[i:m] == b[i:m]:
+                    i = m
+                else:
+                    j = m
+            
+            return i
+        
+        i = j
+        step *= 2
+    
+    return n
+
+def add_hunk(hunks, text, start, end, new_text, trim = True):
+    # hunk replacing text[start:end] with new_text, trimmed of the prefix and suffix they have in common,
+    # or only of the whole lines they have in common if not trim
+    old_text = text[start:end]
+    if old_text == new_text:
+        return
+    
+    prefix = common_prefix_length(old_text, new_text)
+    suffix = common_prefix_length(old_text[prefix:][::-1], new_text[prefix:][::-1])
+    
+    if not trim:
+        prefix = old_text.rfind('\n', 0, prefix) + 1
+        
+        changed_end = len(old_text) - suffix
+        if changed_end > prefix and old_text[changed_end - 1] != '\n':
+            suffix = len(old_text) - (old_text.find('\n', changed_end) + 1 or len(old_text))
+    
+    hunks.append((start + prefix, end - suffix, new_text[prefix:len(new_text) - suffix]))
+
+def split_lines(text):
+    # lines of text split at newlines, keeping them
+    lines = [line + '\n' for line in text.split('\n')]
+    lines[-1] = lines[-1][:-1]
+    
+    if not lines[-1]:
+        lines.pop()
+    
+    return lines
+
+def text_lines(text, start, end, count, from_end = False):
+    # the first count lines of text[start:end], which holds whole lines, or the last count lines if from_end
+    position = end if from_end else start
+    
+    for i in range(count):
+        if from_end:
+            position = text.rfind('\n', start, position - 1) + 1 or start
+        else:
+            position = text.find('\n', position, end) + 1 or end
+    
+    return split_lines(text[position:end] if from_end else text[start:position])
+
+def format_range(start, count):
+    # line range of a unified diff hunk, as difflib
+    if count == 1:
+        return str(start + 1)
+    
+    if count == 0:
+        return '{},0'.format(start)
+    
+    return '{},{}'.format(start + 1, count)
+
+def diff_text(text, new_text):
+    # changes from text to new_text as hunks of Namumark.diff, comparing the lines between their common prefix and suffix
+    start = common_prefix_length(text, new_text)
+    start = text.rfind('\n', 0, start) + 1
+    
+    end = len(text) - common_prefix_length(text[start:][::-1], new_text[start:][::-1])
+    if end > start and text[end - 1] != '\n':
+        end = text.find('\n', end) + 1 or len(text)
+    
+    new_end = len(new_text) - len(text) + end
+    old_lines = split_lines(text[start:end])
+    new_lines = split_lines(new_text[start:new_end])
+    
+    # offsets of the lines in text
+    offsets = [start]
+    for line in old_lines:
+        offsets.append(offsets[-1] + len(line))
+    
+    hunks = []
+    
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old_lines, new_lines).get_opcodes():
+        if tag != 'equal':
+            add_hunk(hunks, text, offsets[i1], offsets[i2], ''.join(new_lines[j1:j2]))
+    
+    return hunks
+
+def compose_hunks(text, hunks, new_text, next_hunks, trim = True):
+    # changes from text to the text made by applying next_hunks to new_text, where hunks change text to new_text.
+    # hunks of both which overlap or touch in new_text are joined into one
+    spans = []
+    delta = 0
+    
+    for start, end, replacement in hunks:
+        spans.append((start + delta, start + delta + len(replacement), len(replacement) - (end - start), None))
+        delta += len(replacement) - (end - start)
+    
+    for start, end, replacement in next_hunks:
+        spans.append((start, end, 0, replacement))
+    
+    spans.sort(key = lambda span: (span[0], span[1]))
+    
+    result = []
+    delta = 0
+    k = 0
+    
+    while k < len(spans):
+        # a run of joined spans in new_text, and the text replacing it
+        start, end = spans[k][0], spans[k][1]
+        run_delta = 0
+        pieces = []
+        position = start
+        
+        while k < len(spans) and spans[k][0] <= end:
+            span_start, span_end, span_delta, replacement = spans[k]
+            end = max(end, span_end)
+            run_delta += span_delta
+            
+            if replacement != None:
+                pieces.append(new_text[position:span_start])
+                pieces.append(replacement)
+                position = span_end
+            
+            k += 1
+        
+        pieces.append(new_text[position:end])
+        add_hunk(result, text, start - delta, end - delta - run_delta, ''.join(pieces), trim)
+        delta += run_delta
+    
+    return result
+
+def merge_hunks(text, hunks, new_text):
+    # hunks of text applied to new_text, a later revision of text, as MergeResult. hunks overlapping a change from
+    # text to new_text, or inserting at the same place, are conflicts and left out
+    changes = diff_text(text, new_text)
+    applied = []
+    conflicts = []
+    k = 0
+    
+    for hunk in hunks:
+        start, end, replacement = hunk
+        
+        while k < len(changes) and changes[k][1] < start:
+            k += 1
+        
+        i = k
+        while i < len(changes) and changes[i][0] <= end:
+            change_start, change_end, change_text = changes[i]
+            
+            if change_start < end and start < change_end or start == end == change_start == change_end:
+                conflicts.append(hunk)
+                break
+            
+            i += 1
+        else:
+            applied.append(hunk)
+    
+    # insertions come before replacements starting at the same place
+    result = []
+    position = 0
+    
+    for start, end, replacement in sorted(applied + changes, key = lambda hunk: (hunk[0], hunk[1])):
+        result.append(text[position:start])
+        result.append(replacement)
+        position = end
+    
+    result.append(text[position:])
+    return MergeResult(''.join(result), conflicts)
+
+def parse_section(namumark_args, section):
+    # parse one section of Namumark.parse_sections in a worker process, on its own text
+    title, level, hidden, text, headings = section
+    
+    namumark = Namumark('', '', **namumark_args)
+    paragraph = Paragraph(namumark, title, level, hidden, text, headings)
+    namumark.sources.clear()
+    
+    try:
+        return pickle.dumps(paragraph, pickle.HIGHEST_PROTOCOL)
+    except RecursionError:
+        # too deep to be sent back, parsed again by the caller
+        return None
 
+class Namumark():
     regex_redirect = re.compile(r'#redirect ')
     
     brackets = [
@@ -2517,6 +3632,15 @@ class Namumark():
         QuotedText, HorizontalLine, Comment
     ]
     
+    # nested parsers are put on the explicit stack of run_parser every this many levels
+    delegation_depth = 32
+    
+    # brackets, singlelines indexed by first character of open tag
+    # rebuild with build_dispatch(), BraceClassifier() after modifying brackets or singlelines
+    bracket_dispatch = build_dispatch(brackets)
+    singleline_dispatch = build_dispatch(singlelines)
+    brace_classifier = BraceClassifier(brackets)
+    
     default_text_color = Color('#212529', '#e0e0e0')
     default_link_color = Color('#0275d8', '#eca019')
     default_table_bgcolor = Color('#f5f5f5', '#2d2f34')
@@ -2525,24 +3649,358 @@ class Namumark():
     namespaces = ['문서', '틀', '분류', '파일', '사용자', '나무위키', '위키운영', '휴지통', '파일휴지통', '템플릿']
     special_namespaces = ['분류', '파일']
 
-    def __init__(self, title, text):
+    # parser implementations, giving the same tree. 'reference' runs MarkedText.parse_line without the shortcuts
+    # of 'fast': reuse of earlier attempts, skipping attempts which can't close or are known to fail,
+    # classifying {{{, skipping plain text in bulk and taking plain table cells as they are
+    engines = ('reference', 'fast')
+    
+    def __init__(self, title, text, lazy = False, max_steps = None, max_depth = None, timeout = None, strict = False, workers = 1, engine = 'fast'):
+        if engine not in self.engines:
+            raise ValueError('unknown engine: {}'.format(engine))
+        
         self.document = Document(title, text)
-
-        self.redirect = None
+        self.engine = engine
+        
+        # text of the revision the document was loaded from, which diff, unified_diff and merge compare with.
+        # apply_text_edit changes document.text, and keeps its changes from base_text in text_hunks
+        self.base_text = text
+        self.text_hunks = []
+        
+        # parse the content of each paragraph, and categories, on first access
+        self.lazy = lazy
+        
+        # limits of a parse, counted from load, apply_text_edit or access of lazy content:
+        # parse attempts, their nesting depth, and seconds.
+        # paragraphs exceeding them are left as RawText, or ParseLimitError is raised if strict
+        self.max_steps = max_steps
+        self.max_depth = max_depth
+        self.timeout = timeout
+        self.strict = strict
+        
+        # processes parsing top level sections, limits are counted for each section then
+        self.workers = workers
+        
+        # whether the text or the redirect was changed after the document was created, see modified
+        self._edited = False
+        
+        self.load()
+    
+    def start_limits(self):
+        self.limited = self.max_steps != None or self.max_depth != None or self.timeout != None
+        self.steps = 0
+        self.deadline = time.monotonic() + self.timeout if self.timeout != None else None
+    
+    def count_step(self, depth):
+        # called by the parsers on every attempt
+        self.steps += 1
+        
+        if self.max_steps != None and self.steps > self.max_steps:
+            raise ParseLimitError('max_steps')
+        if self.max_depth != None and depth > self.max_depth:
+            raise ParseLimitError('max_depth')
+        if self.deadline != None and time.monotonic() > self.deadline:
+            raise ParseLimitError('timeout')
+    
+    def load(self):
+        self.start_limits()
+        
+        self._redirect = None
         self.paragraphs = None
-        self.categories: list[Category] = []
+        self._categories = None
+        
+        self.sources = {}
 
         self.parse()
+        self.sources.clear()
         
-        if self.paragraphs:
-            self.parse_category()
+        if not self.lazy:
+            self.categories
+    
+    @property
+    def categories(self) -> list[Category]:
+        if self._categories == None:
+            self._categories = []
+            
+            if self.paragraphs:
+                self.parse_category()
+        
+        return self._categories
+    
+    @categories.setter
+    def categories(self, categories):
+        self._categories = categories
+    
+    @property
+    def redirect(self):
+        return self._redirect
+    
+    @redirect.setter
+    def redirect(self, redirect):
+        if redirect != self._redirect:
+            self._edited = True
+        
+        self._redirect = redirect
+    
+    @property
+    def modified(self):
+        # whether render() may differ from the text the document was created with, kept by the flags of the changed
+        # nodes instead of comparing texts. duplicate categories are extracted on load, so they are a change already
+        if self._edited:
+            return True
+        
+        if self._categories and any(c.position != CategoryPosition.KEEP for c in self._categories):
+            return True
+        
+        return self.paragraphs != None and self.paragraphs.modified
 
     def parse(self):
         if match := self.regex_redirect.match(self.document.text):
-            self.redirect = self.document.text[match.end():]
+            self._redirect = self.document.text[match.end():]
         else:
             self.paragraphs = Paragraph(self, None, 0, False, self.document.text)
     
+    def parse_sections(self, text, sections):
+        # parse (title, level, hidden, headings, start, end) of top level sections in a process pool,
+        # sending each section its own text and moving the results back into text
+        args = {'max_steps': self.max_steps, 'max_depth': self.max_depth, 'timeout': self.timeout, 'strict': self.strict, 'engine': self.engine}
+        jobs = [(title, level, hidden, text[start:end], [(h[0] - start, h[1] - start) + h[2:] for h in headings]) for title, level, hidden, headings, start, end in sections]
+        
+        with concurrent.futures.ProcessPoolExecutor(self.workers) as executor:
+            data = list(executor.map(parse_section, [args] * len(jobs), jobs, chunksize = max(1, len(jobs) // (self.workers * 4))))
+        
+        result = []
+        for section, (title, level, hidden, headings, start, end) in zip(data, sections):
+            if section == None:
+                result.append(Paragraph(self, title, level, hidden, text, headings, start, end))
+                continue
+            
+            section = pickle.loads(section)
+            result.append(section)
+            
+            for p in section:
+                p.namumark = self
+                p.source = text
+                p.start += start
+                p.end += start
+                p.intro_end += start
+                
+                for line in ([p.title] if p.title else []) + p.content:
+                    for node in line:
+                        if isinstance(node, MarkedText):
+                            node.namumark = self
+                        
+                        if isinstance(node, Table):
+                            for comment, row in node.comments:
+                                comment.namumark = self
+        
+        return result
+
+    # links with plain text only, and lines of text and such links, which the parser reads without trying any other construct
+    re_plain_char = r"(?:[^\n',\-<\[\]^_{|}~\\]|'(?!')|,(?!,)|-(?!-)|<(?!math>)|\^(?!\^)|_(?!_)|~(?!~))"
+    re_plain_link = re.compile(r'\[\[{0}*(?:\|{0}*)?\]\]'.format(re_plain_char))
+    re_link_line = re.compile(r'(?![ >]|##)(?:{}|{})*'.format(re_plain_char, re_plain_link.pattern))
+    
+    # table rows of such cells, whose links are the same whether the rows are taken in a table or as text. styles take
+    # no brackets, and rows take no quotes, with which a style could run on over a link, nor > and # out of links, with
+    # which a cell could start a quote or a comment. a row breaking the table drops its text, so only whole tables of
+    # such rows are read with it
+    re_row_char = r"(?:[^\n',\-<>#\[\]^_{|}~\\\"]|,(?!,)|-(?!-)|\^(?!\^)|_(?!_)|~(?!~))"
+    re_plain_row = re.compile(r'\|\|(?:<(?!math>)[^<>\[\]\n"\']*>|{0}|\[\[{1}*(?:\|{1}*)?\]\]|\|\|)*\|\|'.format(re_row_char, '(?:[>#]|{})'.format(re_row_char)))
+    
+    # wiki blocks over such lines, which the parser takes as WikiDiv from anywhere in a line. the rest of the open line
+    # is taken in by the style attributes, so it only needs to have no brackets
+    re_plain_wiki = re.compile(r'\{{\{{\{{#!wiki[^\n{{}}\[\]]*\n((?:{0}\n)*{0})\}}\}}\}}'.format(re_link_line.pattern))
+    
+    # constructs opened by [ or <math>, whose open tag can't be part of a close tag. the parser tries them wherever
+    # the text before doesn't take them in, so they can be looked for alone in lines without block_open
+    scan_inline = ('LinkedText', 'FootnoteText', 'Macro', 'MathText')
+    re_inline_open = re.compile(r'\[|<math>')
+    
+    # other constructs which can carry a line over a newline: multiline brackets, and tables and quotes at the line start
+    re_block_open = re.compile(r'\{\{\{|\{\{\||^ *(?:(?:\*|1\.|A\.|a\.|I\.|i\.)(?:#[0-9]+)? ?)?\||^ *>', flags = re.MULTILINE)
+    
+    @classmethod
+    def scan(cls, text, types = ('LinkedText',), title = ''):
+        # nodes of the given types (class names) in text, in document order, as ScanResult(node, start, end)
+        # with offsets in text, the same as a lazy parse with find_all gives. lines which can't hold the nodes
+        # are skipped, and lines, tables and wiki blocks of nothing but text and plain links are read with regexes,
+        # so only the lines with other markup are parsed
+        classes = {c.name: c for c in cls.brackets + cls.singlelines + [Table]}
+        for t in types:
+            if t not in classes:
+                raise ValueError('unknown node type: {}'.format(t))
+        
+        # lines without these are parsed on their own and can't hold the nodes
+        opens = [re.escape(classes[t].open) for t in types if classes[t].open]
+        pattern = re.compile('|'.join(opens + [MarkedText.re_multiline_open.pattern, cls.re_block_open.pattern]), flags = re.IGNORECASE | re.MULTILINE)
+        
+        namumark = cls(title, text, lazy = True)
+        result = []
+        
+        if not namumark.paragraphs:
+            return result
+        
+        for p in namumark.paragraphs:
+            if p.title:
+                collect_nodes(p.title, set(types), p.match_heading().start('title'), result)
+            
+            namumark.scan_content(text[p.start:p.intro_end], set(types), pattern, p.start, result)
+        
+        return result
+    
+    def scan_content(self, content, types, pattern, offset, result):
+        # scan of the content of a paragraph, which starts at offset in the text
+        inline = types.issubset(self.scan_inline)
+        i = 0
+        
+        while i < len(content):
+            match = pattern.search(content, i)
+            if not match:
+                break
+            
+            i = max(i, content.rfind('\n', i, match.start()) + 1)
+            end = content.find('\n', i)
+            if end < 0:
+                end = len(content)
+            
+            if not self.re_link_line.fullmatch(content, i, end):
+                end = self.plain_table_end(content, i) if 'Table' not in types else None
+            
+            if end != None:
+                if 'LinkedText' in types:
+                    for link in self.plain_links(content, i, end):
+                        result.append(ScanResult(link, offset + link.start, offset + link.end))
+                
+                i = end + 1
+            elif inline and (scanned := self.scan_inline_line(content, i, pattern)):
+                nodes, i = scanned
+                for node in nodes:
+                    collect_nodes(node, types, offset, result)
+            else:
+                line, i = run_parser(MarkedText.iter_parse_line(content, self, offset = i, depth = 1))
+                if self.get_source(content).reused:
+                    line.adopt_children()
+                
+                collect_nodes(line, types, offset, result)
+        
+        self.sources.clear()
+    
+    def plain_table_end(self, content, offset):
+        # end of the table at offset if each of its rows matches re_plain_row, or None
+        end = offset - 1
+        
+        while content.startswith('||', end + 1):
+            start = end + 1
+            end = content.find('\n', start)
+            if end < 0:
+                end = len(content)
+            
+            if not self.re_plain_row.fullmatch(content, start, end):
+                return None
+        
+        # a comment may go on with the table
+        if end < offset or content.startswith('##', end + 1):
+            return None
+        
+        return end
+    
+    def scan_inline_line(self, content, offset, pattern):
+        # top level line at offset, parsed by trying only the scan_inline constructs and re_plain_wiki blocks,
+        # as (nodes, end of the line), or None if it holds another construct which can carry it over a newline.
+        # pattern is that of scan
+        end = content.find('\n', offset)
+        if end < 0:
+            end = len(content)
+        
+        i = offset
+        
+        # comments are left as they are
+        if content.startswith('##', offset):
+            if self.re_block_open.search(content, offset, end):
+                return None
+            
+            i = end
+        
+        result = []
+        
+        # the rest of a line without pattern holds no nodes, and nodes opened in it end in the line
+        while pattern.search(content, i, end):
+            match = self.re_inline_open.search(content, i, end)
+            block = self.re_block_open.search(content, i, match.start() if match else end)
+            
+            if block:
+                wiki = self.re_plain_wiki.match(content, block.start())
+                if not wiki:
+                    return None
+                
+                result += self.plain_links(content, wiki.start(1), wiki.end(1))
+                i = wiki.end()
+            elif match:
+                i = self.scan_inline_node(content, match, result)
+            else:
+                break
+            
+            if i > end:
+                # the line goes on after a node or block over a newline
+                end = content.find('\n', i)
+                if end < 0:
+                    end = len(content)
+        
+        return result, end + 1
+    
+    def scan_inline_node(self, content, match, result):
+        # scan_inline construct opened at match, appended to result if the parser takes it, and the offset after
+        if self.re_plain_link.match(content, match.start()):
+            node = self.plain_link(content, match.start())
+            result.append(node)
+            return node.end
+        
+        source = self.get_source(content)
+        for b in self.bracket_dispatch[match[0][0]]:
+            if content.startswith(b.open, match.start()) and b.may_close(source, match.start()):
+                node, i = run_parser(b.iter_parse_line(content, self, match.start(), depth = 1))
+                if node:
+                    if source.reused:
+                        node.adopt_children()
+                    
+                    result.append(node)
+                    return i
+        
+        return match.start() + 1
+    
+    def plain_links(self, content, start, end):
+        # links in content[start:end], a part of a line or lines which hold no other markup
+        result = []
+        
+        i = content.find('[[', start, end)
+        while i >= 0:
+            link = self.plain_link(content, i)
+            result.append(link)
+            
+            i = content.find('[[', link.end, end)
+        
+        return result
+    
+    def plain_link(self, content, start):
+        # link at start matched by re_plain_link, built as the parser does
+        close = content.find(']]', start)
+        
+        link = LinkedText(self, [])
+        i = link.preprocess(content, start + len(link.open))
+        if i < close:
+            link.content.append(PlainText(content[i:close], i))
+        
+        link.start, link.end = start, link.postprocess(content, close + len(link.close))
+        return link
+    
+    def get_source(self, content):
+        # token index of content, shared by every parse_line call on the same string
+        source = self.sources.get(content)
+        if source == None:
+            source = self.sources[content] = lexer.Source(content)
+        
+        return source
+    
     def find_category(self, category):
         for c in self.categories:
             if c.link == category:
@@ -2550,13 +4008,144 @@ class Namumark():
         return None
     
     def parse_category(self):
-        links: list[LinkedText] = self.paragraphs.find_all(type = 'LinkedText', namespace = '분류', escape = False, recursive = True)
+        for p in self.paragraphs:
+            p.collect_category_links()
+            
+            for name, l in p.title_category_links + p.category_links:
+                if not self.find_category(name):
+                    self.categories.append(Category.create(l))
+                else:
+                    l.extract(cascade = True)
+    
+    def first_category_links(self):
+        # category links kept by parse_category, by id
+        seen = set()
+        result = {}
+        
+        for p in self.paragraphs:
+            for name, l in p.title_category_links + p.category_links:
+                if name not in seen:
+                    seen.add(name)
+                    result[id(l)] = l
         
-        for l in links:
-            if not self.find_category(l.link):
-                self.categories.append(Category.create(l))
+        return result
+    
+    def apply_text_edit(self, start, end, replacement):
+        # replace document.text[start:end], re-parsing only the section which can be affected
+        text = self.document.text
+        if not 0 <= start <= end <= len(text):
+            raise ValueError()
+        
+        new_text = text[:start] + replacement + text[end:]
+        delta = len(replacement) - (end - start)
+        self.document.text = new_text
+        self.text_hunks = compose_hunks(self.base_text, self.text_hunks, text, [(start, end, replacement)])
+        
+        if replacement != text[start:end]:
+            self._edited = True
+        
+        self.start_limits()
+        
+        if not self.paragraphs or self.regex_redirect.match(new_text):
+            self.load()
+            return
+        
+        # headings are single lines, so only the lines touched by the edit can gain or lose one
+        line_start = text.rfind('\n', 0, start) + 1
+        line_end = text.find('\n', end)
+        if line_end < 0:
+            line_end = len(text)
+        
+        old_headings = Paragraph.scan_headings(text, line_start, line_end)
+        new_headings = Paragraph.scan_headings(new_text, line_start, line_end + delta)
+        
+        # a section keeps its place in the tree as long as new headings in it are deeper than itself
+        path = self.paragraphs.find_section(line_start, line_end, min((h[2] for h in new_headings), default = 7))
+        target = path[-1]
+        
+        if (old_headings or new_headings) and target is self.paragraphs:
+            self.load()
+            return
+        
+        # categories not parsed yet are left to be parsed from the new text
+        categories = self._categories != None
+        if categories:
+            kept = self.first_category_links()
+        
+        for p in self.paragraphs:
+            p.source = new_text
+            
+            if p.start > line_end:
+                p.start += delta
+                p.end += delta
+                p.intro_end += delta
+        
+        for p in path:
+            p.end += delta
+        
+        if old_headings or new_headings:
+            # re-parse the whole section below its unchanged heading line
+            heading_start = new_text.rfind('\n', 0, target.start - 1) + 1
+            h = Paragraph.scan_headings(new_text, heading_start, target.start - 1)[0]
+            
+            section = Paragraph(self, h[4], h[2], h[3], new_text, None, target.start, target.end)
+            parent = path[-2]
+            parent.child[parent.child.index(target)] = section
+            
+            if categories:
+                new_links = {}
+                for p in section:
+                    p.collect_category_links()
+                    new_links.update((id(l), l) for name, l in p.title_category_links + p.category_links)
+        else:
+            # re-parse the content before the first child only
+            target.intro_end += delta
+            
+            # parsed from the new text, so copied from it when rendered
+            target.dirty = False
+            
+            if self.lazy:
+                target._content = None
             else:
-                l.extract(cascade = True)
+                target._content = target.parse_content(new_text[target.start:target.intro_end])
+            
+            if categories:
+                target.collect_category_links(title = False)
+                new_links = {id(l): l for name, l in target.category_links}
+        
+        self.sources.clear()
+        
+        if categories and not self.update_categories(kept, new_links):
+            self.load()
+    
+    def update_categories(self, kept, new_links):
+        # redo parse_category after an edit, given the links kept before it and the newly parsed links
+        seen = set()
+        first = []
+        extract = []
+        
+        for p in self.paragraphs:
+            for name, l in p.title_category_links + p.category_links:
+                if name not in seen:
+                    seen.add(name)
+                    first.append(l)
+                    
+                    if id(l) not in new_links and id(l) not in kept:
+                        # a link extracted before the edit would be kept now
+                        return False
+                elif id(l) in new_links or id(l) in kept:
+                    extract.append(l)
+        
+        # categories take alt from their link before duplicates inside it are extracted, as in parse_category
+        categories = {id(c._link_object): c for c in self.categories if c._link_object}
+        added = [c for c in self.categories if not c._link_object and c.link not in seen]
+        
+        self.categories = [categories.get(id(l)) or Category.create(l) for l in first] + added
+        
+        for l in extract:
+            l.extract(cascade = True)
+        
+        return True
     
     def add_category(self, category, blur = False, alt = None):
         if not category:
@@ -2588,14 +4177,29 @@ class Namumark():
             c.position = position
     
     def render(self):
+        return ''.join(self.iter_render())
+    
+    def render_to(self, fp):
+        # write the rendered document to a writable text stream chunk by chunk
+        for chunk in self.iter_render():
+            fp.write(chunk)
+    
+    def iter_render(self):
+        # render() in chunks, in order
+        for part in self.render_parts():
+            yield from iter_render(part)
+    
+    def render_parts(self):
+        # the rendered document as strings and nodes, after moving the categories to their positions
         if self.redirect:
-            return '#redirect ' + self.redirect
+            yield '#redirect ' + self.redirect
         else:
             category_top_paragraph = MarkedText(self)
             category_bottom_paragraph = MarkedText(self)
             
-            if self.categories:
-                for c in self.categories:
+            # categories never accessed are still in place
+            if self._categories:
+                for c in self._categories:
                     if c.position == CategoryPosition.KEEP:
                         continue
                         
@@ -2607,12 +4211,220 @@ class Namumark():
                     elif c.position == CategoryPosition.BOTTOM:
                         category_bottom_paragraph.append_child(l)
             
-            result = str(self.paragraphs)
+            if self._categories and category_top_paragraph.content:
+                yield category_top_paragraph
+                yield '\n'
+            
+            yield self.paragraphs
+            
+            if self._categories and category_bottom_paragraph.content:
+                yield '\n'
+                yield category_bottom_paragraph
+    
+    def diff(self, trim = True):
+        # changes from base_text to render() as (start, end, new_text) hunks, in order: base_text[start:end]
+        # is replaced by new_text. only the text between pieces copied from the source text is compared,
+        # so unchanged nodes cost no more than copying them. if not trim, hunks hold the whole lines of the changed
+        # nodes, down to the unchanged nodes around them. changes of apply_text_edit are joined with them
+        text = self.document.text
+        
+        # offset in text of each string the copied pieces may come from, -1 for strings found at several offsets,
+        # such as short strings python shares
+        offsets = {id(text): 0}
+        sources = []
+        
+        if self.paragraphs:
+            for p in self.paragraphs:
+                if p.content_source != None:
+                    sources.append((p.content_source, p.start))
                 
-            if self.categories:
-                if category_top_paragraph.content:
-                    result = str(category_top_paragraph) + '\n' + result
-                if category_bottom_paragraph.content:
-                    result += '\n' + str(category_bottom_paragraph)
+                if p.level > 0 and p.title and not p.outline_dirty and isinstance(p.title.source, str):
+                    # title in the unchanged heading line before the content
+                    start = p.source.rfind('\n', 0, p.start - 1) + 1 + p.level + p.hidden + 1
+                    if text.startswith(p.title.source, start):
+                        sources.append((p.title.source, start))
+        
+        for source, start in sources:
+            offsets[id(source)] = start if offsets.get(id(source), start) == start else -1
+        
+        hunks = []
+        start = 0
+        new = []
+        
+        for part in self.render_parts():
+            for piece in iter_pieces(part, anchored = True):
+                if type(piece) is SourceText and offsets.get(id(piece.source), -1) >= 0:
+                    # pieces moved before the end of the previous copied piece are new text
+                    end = offsets[id(piece.source)] + piece.start
+                    if end >= start:
+                        add_hunk(hunks, text, start, end, ''.join(new), trim)
+                        start = end + len(piece)
+                        new.clear()
+                        continue
                 
-            return result
+                new.append(piece)
+        
+        add_hunk(hunks, text, start, len(text), ''.join(new), trim)
+        
+        if self.text_hunks:
+            hunks = compose_hunks(self.base_text, self.text_hunks, text, hunks, trim)
+        
+        return hunks
+    
+    def merge(self, new_text, hunks = None):
+        # changed nodes and text edits rebased onto new_text, a later revision of base_text, as MergeResult of merge_hunks.
+        # the document is left as it is, and has to be parsed again from the merged text for further changes
+        if hunks == None:
+            hunks = self.diff(trim = False)
+        
+        return merge_hunks(self.base_text, hunks, new_text)
+    
+    def unified_diff(self, hunks = None, n = 3, fromfile = '', tofile = ''):
+        # diff() as the lines of a unified diff with n lines of context, like difflib.unified_diff of the lines of
+        # base_text and render(). lines are split at newlines, and only the lines around the hunks are read:
+        # the lines of hunks on the same or adjacent lines are compared with difflib.SequenceMatcher, and the
+        # opcodes grouped as difflib does
+        text = self.base_text
+        if hunks == None:
+            hunks = self.diff()
+        
+        # hunks widened to whole lines, with the n lines of context and one more line around them, so changes
+        # that could be placed before or after equal lines are placed as difflib places them:
+        # [start, end, new text up to the end of the last hunk, end of the last hunk]
+        blocks = []
+        
+        for start, end, new_text in hunks:
+            line_start = text.rfind('\n', 0, start) + 1
+            for i in range(n + 1):
+                if line_start > 0:
+                    line_start = text.rfind('\n', 0, line_start - 1) + 1
+            
+            if blocks and line_start <= blocks[-1][1]:
+                # on the lines of the previous block, or on the line after it
+                line_start, line_end, block_text, block_end = blocks.pop()
+                new_text = block_text + text[block_end:start] + new_text
+            else:
+                new_text = text[line_start:start] + new_text
+            
+            line_end = end
+            if end < len(text) and (end > 0 and text[end - 1] != '\n' or new_text and new_text[-1] != '\n'):
+                line_end = text.find('\n', end) + 1 or len(text)
+            for i in range(n + 1):
+                if line_end < len(text):
+                    line_end = text.find('\n', line_end) + 1 or len(text)
+            
+            blocks.append([line_start, line_end, new_text, end])
+        
+        # opcodes of the lines as SequenceMatcher.get_opcodes, with the old and new lines of the changes,
+        # or for unchanged lines the offsets in text of their start and end and the number of the first line
+        codes = []
+        line = new_line = 0
+        position = 0
+        
+        for start, end, new_text, block_end in blocks + [[len(text), len(text), '', len(text)]]:
+            count = text.count('\n', position, start)
+            if start == len(text) and position < start and text[-1] != '\n':
+                count += 1
+            
+            old_lines = split_lines(text[start:end])
+            new_lines = split_lines(new_text + text[block_end:end])
+            offsets = [start]
+            for l in old_lines:
+                offsets.append(offsets[-1] + len(l))
+            
+            # the unchanged lines before the block, numbered back from it
+            opcodes = [('equal', -count, 0, -count, 0)] if count else []
+            line += count
+            new_line += count
+            opcodes += difflib.SequenceMatcher(None, old_lines, new_lines).get_opcodes()
+            
+            for tag, i1, i2, j1, j2 in opcodes:
+                if tag == 'equal':
+                    if codes and codes[-1][0] == 'equal':
+                        codes[-1][2] += i2 - i1
+                        codes[-1][4] += j2 - j1
+                        codes[-1][5] = (codes[-1][5][0], offsets[i2], codes[-1][5][2])
+                    else:
+                        codes.append(['equal', line + i1, line + i2, new_line + j1, new_line + j2, (offsets[i1] if i1 >= 0 else position, offsets[i2], line + i1)])
+                else:
+                    codes.append([tag, line + i1, line + i2, new_line + j1, new_line + j2, (old_lines[i1:i2], new_lines[j1:j2])])
+            
+            line += len(old_lines)
+            new_line += len(new_lines)
+            position = end
+        
+        if not any(code[0] != 'equal' for code in codes):
+            return []
+        
+        # groups of opcodes with up to 2n unchanged lines between them, with n unchanged lines around each group
+        if codes[0][0] == 'equal':
+            codes[0][1] = max(codes[0][1], codes[0][2] - n)
+            codes[0][3] = max(codes[0][3], codes[0][4] - n)
+        if codes[-1][0] == 'equal':
+            codes[-1][2] = min(codes[-1][2], codes[-1][1] + n)
+            codes[-1][4] = min(codes[-1][4], codes[-1][3] + n)
+        
+        groups = [[]]
+        for tag, i1, i2, j1, j2, lines in codes:
+            if tag == 'equal' and i2 - i1 > 2 * n:
+                groups[-1].append((tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n), lines))
+                groups.append([])
+                i1, j1 = max(i1, i2 - n), max(j1, j2 - n)
+            
+            groups[-1].append((tag, i1, i2, j1, j2, lines))
+        
+        if len(groups[-1]) == 1 and groups[-1][0][0] == 'equal':
+            groups.pop()
+        
+        result = ['--- {}\n'.format(fromfile), '+++ {}\n'.format(tofile)]
+        
+        for group in groups:
+            result.append('@@ -{} +{} @@\n'.format(format_range(group[0][1], group[-1][2] - group[0][1]), format_range(group[0][3], group[-1][4] - group[0][3])))
+            
+            for tag, i1, i2, j1, j2, lines in group:
+                if tag == 'equal':
+                    # read from the start of the unchanged lines, or from their end if the first are left out
+                    start, end, first = lines
+                    result += [' ' + l for l in text_lines(text, start, end, i2 - i1, from_end = i1 > first)]
+                else:
+                    result += ['-' + l for l in lines[0]]
+                    result += ['+' + l for l in lines[1]]
+        
+        return result
+
+def iter_sections(title, text, **kwargs):
+    # parse text one paragraph at a time, yielding each paragraph, in document order, once its content is parsed.
+    # the content is dropped when the next paragraph is parsed (and parsed again if accessed later),
+    # and categories are left in place as with lazy = True
+    namumark = Namumark(title, text, lazy = True, **kwargs)
+    if not namumark.paragraphs:
+        return
+    
+    for p in namumark.paragraphs:
+        p.content
+        yield p
+        p.content = None
+
+def collect_nodes(line, types, offset, result):
+    # append ScanResult of the nodes of the given types in a line parsed from a string starting at offset
+    stack = [(iter((line,)), lambda k: offset + k)]
+
+    while stack:
+        nodes, to_text = stack[-1]
+
+        for node in nodes:
+            if not isinstance(node, MarkedText):
+                continue
+
+            if node.name in types:
+                result.append(ScanResult(node, to_text(node.start), to_text(node.end)))
+
+            if isinstance(node, QuotedText):
+                stack.append((iter(node.content), lambda k, quote = node, to_text = to_text: to_text(quote.source_offset(k))))
+            elif not isinstance(node.content, str):
+                stack.append((iter(node.get_children()), to_text))
+            else:
+                continue
+            break
+        else:
+            stack.pop()